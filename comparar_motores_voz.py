@@ -5,24 +5,38 @@ ahora incluyendo gTTS (Google Translate TTS, gratuito).
 """
 
 import os
+import copy
 import sys
 import time
+import threading
+import cmd
+import atexit
+import json
+import hashlib
 import logging
+import importlib.util
+from concurrent.futures import ThreadPoolExecutor
 from enum import Enum
 
-# Configurar logging
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
-)
+# orjson es opcional; acelera la lectura y escritura de la configuración
+try:
+    import orjson
+    ORJSON_DISPONIBLE = True
+except ImportError:
+    ORJSON_DISPONIBLE = False
+
+# Rutas resueltas una sola vez al cargar el script
+CONFIG_PATH = os.path.abspath("configuracion_voz.json")
+TEMP_AUDIO_DIR = os.path.abspath("temp_audio")
 
-# Asegurar que podemos importar desde el directorio del proyecto
-script_dir = os.path.dirname(os.path.abspath(__file__))
-proyecto_dir = os.path.dirname(script_dir)
-sys.path.insert(0, proyecto_dir)
+# Caché persistente de audios sintetizados (en un subdirectorio para que
+# VoiceEngine.cerrar() no lo vacíe al limpiar temp_audio)
+CACHE_AUDIO_DIR = os.path.join(TEMP_AUDIO_DIR, "cache")
+CACHE_TTL = 7 * 24 * 3600  # Segundos que se conserva un audio sin usar
+CACHE_MAX_BYTES = 200 * 1024 * 1024  # Tamaño máximo del caché en disco
 
-# Asegúrate de que existe el directorio temp_audio
-os.makedirs("temp_audio", exist_ok=True)
+# Clase VoiceEngine, importada la primera vez que se necesita
+VoiceEngine = None
 
 # Textos de prueba para los motores
 TEXTO_PRUEBA_CORTO = "Hola, esta es una prueba del sistema de voz mejorado. ¿Cómo suena este motor?"
@@ -38,77 +52,676 @@ class OpcionMotor(Enum):
     GOOGLE = "google_tts"
     GTTS = "gtts"
 
-def probar_motor(motor, texto, usar_config_predeterminada=True):
+# Textos fijos de la interfaz, construidos una sola vez para imprimirlos de golpe
+BANNER_COMPARACION = "\n".join([
+    "===== COMPARACIÓN DE MOTORES DE VOZ MEJORADA =====",
+    "Este script te permitirá probar y comparar los diferentes motores de voz disponibles.",
+    "Ahora incluye gTTS, un motor gratuito de alta calidad de Google Translate."
+])
+
+MENU_COMPARACION = "\n".join([
+    "\n===== MENÚ DE COMPARACIÓN =====",
+    "1. Probar pyttsx3 (voz básica, sin internet)",
+    "2. Probar Google TTS (alta calidad, requiere internet y credenciales)",
+    "3. Probar gTTS (buena calidad, gratuito)",
+    "4. Comparación directa de todos los motores disponibles",
+    "5. Prueba avanzada (texto largo)",
+    "6. Prueba de saludos del sistema",
+    "7. Modificar velocidad/tono",
+    "8. Configurar gTTS como predeterminado",
+    "9. Salir"
+])
+
+# Motores que se pueden elegir en el menú: opción -> (motor, nombre, paquete pip)
+MOTORES_MENU = {
+    "1": (OpcionMotor.PYTTSX3.value, "pyttsx3", "pyttsx3"),
+    "2": (OpcionMotor.GOOGLE.value, "Google TTS", "google-cloud-texttospeech"),
+    "3": (OpcionMotor.GTTS.value, "gTTS", "gtts")
+}
+
+# Descripción de cada motor para el listado de motores disponibles
+DESCRIPCION_MOTORES = {
+    OpcionMotor.PYTTSX3.value: "básico",
+    OpcionMotor.GOOGLE.value: "alta calidad, pago",
+    OpcionMotor.GTTS.value: "Google Translate, gratuito"
+}
+
+# Plantilla del listado de motores disponibles, con un hueco por motor
+PLANTILLA_MOTORES_DISPONIBLES = "\n".join(
+    ["\nMotores disponibles:"] +
+    [f" - {nombre} ({DESCRIPCION_MOTORES[motor]}): {{{motor}}}" for motor, nombre, _ in MOTORES_MENU.values()]
+)
+
+# Configuración de voz, cargada una sola vez al iniciar la comparación
+CONFIG = {}
+_config_existe = False
+
+# Última versión de CONFIG escrita o leída y la marca de tiempo del archivo
+# en ese momento, para no reescribirlo si nada ha cambiado
+_ultima_config_guardada = (None, None)
+
+def _bootstrap():
+    """Prepara logging, sys.path y directorios; solo al ejecutar el script directamente."""
+    # Configurar logging
+    logging.basicConfig(
+        level=logging.INFO,
+        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+    )
+    
+    # Asegurar que podemos importar desde el directorio del proyecto
+    script_dir = os.path.dirname(os.path.abspath(__file__))
+    proyecto_dir = os.path.dirname(script_dir)
+    sys.path.insert(0, proyecto_dir)
+    
+    # Asegúrate de que existen el directorio temp_audio y su caché
+    os.makedirs(CACHE_AUDIO_DIR, exist_ok=True)
+    
+    # Expulsar del caché los audios caducados al salir, aunque sea por un error
+    atexit.register(_limpiar_cache_audio)
+    
+    # Cerrar los motores compartidos al salir
+    atexit.register(_cerrar_motores_abiertos)
+
+def _modulo_instalado(nombre):
+    """Comprueba si un módulo está instalado sin ejecutar su código."""
+    try:
+        return importlib.util.find_spec(nombre) is not None
+    except (ImportError, ValueError):
+        return False
+
+def _cargar_voice_engine():
+    """Importa VoiceEngine la primera vez que se usa y devuelve la clase, o None si falla."""
+    global VoiceEngine
+    if VoiceEngine is None:
+        try:
+            from sistema.voice_engine import VoiceEngine as clase_voice_engine
+        except ImportError as e:
+            print(f"ERROR: No se pudo importar el motor de voz: {e}")
+            return None
+        VoiceEngine = clase_voice_engine
+    return VoiceEngine
+
+def _json_loads(datos):
+    """Decodifica JSON con orjson si está disponible o con json en su defecto."""
+    if ORJSON_DISPONIBLE:
+        return orjson.loads(datos)
+    return json.loads(datos)
+
+def _json_dumps(obj):
+    """Codifica JSON con sangría, con orjson si está disponible o con json en su defecto."""
+    if ORJSON_DISPONIBLE:
+        return orjson.dumps(obj, option=orjson.OPT_INDENT_2)
+    return json.dumps(obj, indent=4).encode("utf-8")
+
+def _cargar_config_voz():
+    """Carga configuracion_voz.json en CONFIG si ha cambiado en disco desde la última lectura."""
+    global _config_existe
+    mtime = _mtime_config()
+    _config_existe = mtime is not None
+    if _config_existe and mtime == _ultima_config_guardada[1]:
+        return
+    
+    CONFIG.clear()
+    if not _config_existe:
+        return
+    
+    try:
+        with open(CONFIG_PATH, "rb") as f:
+            CONFIG.update(_json_loads(f.read()))
+        _recordar_config_guardada()
+    except (OSError, ValueError):
+        pass
+
+def _mtime_config():
+    """Devuelve la marca de tiempo de configuracion_voz.json o None si no existe."""
+    try:
+        return os.stat(CONFIG_PATH).st_mtime_ns
+    except OSError:
+        return None
+
+def _recordar_config_guardada():
+    """Anota CONFIG y la marca de tiempo del archivo como el estado guardado actual."""
+    global _ultima_config_guardada
+    _ultima_config_guardada = (copy.deepcopy(CONFIG), _mtime_config())
+
+def _guardar_config_voz():
+    """Escribe CONFIG en configuracion_voz.json de forma atómica, salvo que no haya cambiado."""
+    global _config_existe
+    # VoiceEngine también escribe el archivo, así que se compara su mtime además del contenido
+    if _ultima_config_guardada == (CONFIG, _mtime_config()):
+        return
+    
+    ruta_tmp = CONFIG_PATH + ".tmp"
+    with open(ruta_tmp, "wb") as f:
+        f.write(_json_dumps(CONFIG))
+    os.replace(ruta_tmp, CONFIG_PATH)
+    _config_existe = True
+    _recordar_config_guardada()
+
+def _clave_cache(motor, texto, config):
+    """Calcula la clave de caché de un audio según el motor, la voz, sus parámetros y el texto."""
+    datos = "|".join(str(valor) for valor in (
+        motor,
+        config.get(motor, {}).get("voz_preferida", ""),
+        config.get("voz_genero", ""),
+        config.get("voz_idioma", "es"),
+        config.get("velocidad", 1.0),
+        config.get("tono", 0.0),
+        texto
+    ))
+    return hashlib.sha256(datos.encode("utf-8")).hexdigest()
+
+def _buscar_en_cache(clave):
+    """Devuelve la ruta del audio en caché para la clave dada o None si no existe."""
+    for extension in (".mp3", ".wav"):
+        ruta = os.path.join(CACHE_AUDIO_DIR, clave + extension)
+        try:
+            # Actualizar la fecha de uso para que la limpieza expulse primero lo menos usado
+            os.utime(ruta)
+            return ruta
+        except OSError:
+            continue
+    return None
+
+def _guardar_metadatos_cache(clave, motor):
+    """Guarda junto al audio en caché un pequeño JSON con su motor y fecha de creación."""
+    try:
+        with open(os.path.join(CACHE_AUDIO_DIR, clave + ".json"), "w", encoding="utf-8") as f:
+            json.dump({"motor": motor, "creado": time.time()}, f)
+    except OSError:
+        pass
+
+def _eliminar_de_cache(ruta_audio):
+    """Elimina un audio del caché junto con su JSON de metadatos."""
+    for ruta in (ruta_audio, os.path.splitext(ruta_audio)[0] + ".json"):
+        try:
+            os.remove(ruta)
+        except OSError:
+            pass
+
+def _limpiar_cache_audio():
+    """Expulsa del caché los audios sin usar durante más de CACHE_TTL y, si sigue
+    ocupando más de CACHE_MAX_BYTES, los usados hace más tiempo."""
+    ahora = time.time()
+    audios = []
+    try:
+        with os.scandir(CACHE_AUDIO_DIR) as entradas:
+            for entrada in entradas:
+                if entrada.is_file() and not entrada.name.endswith(".json"):
+                    info = entrada.stat()
+                    audios.append((info.st_mtime, info.st_size, entrada.path))
+    except OSError:
+        return
+    
+    # Recorrer del menos al más recientemente usado
+    audios.sort()
+    total = sum(tamaño for _, tamaño, _ in audios)
+    for mtime, tamaño, ruta in audios:
+        if ahora - mtime <= CACHE_TTL and total <= CACHE_MAX_BYTES:
+            break
+        _eliminar_de_cache(ruta)
+        total -= tamaño
+
+def _crear_motor(motor, usar_config_predeterminada=True):
+    """Crea un VoiceEngine con el motor indicado."""
+    if _cargar_voice_engine() is None:
+        raise RuntimeError("el motor de voz no está disponible")
+    
+    if usar_config_predeterminada:
+        # Usar el archivo de configuración predeterminado
+        voice = VoiceEngine()
+        
+        # Cambiar al motor deseado
+        if hasattr(voice, 'motor_actual') and getattr(voice, 'motor_actual', None) and voice.motor_actual.value != motor:
+            print(f"Cambiando motor a {motor}...")
+            voice.cambiar_motor(motor)
+        return voice
+    
+    # Configuración específica para el motor, solo en memoria
+    config = copy.deepcopy(CONFIG)
+    config["motor"] = motor
+    return VoiceEngine(config_dict=config)
+
+# Un VoiceEngine compartido por motor, creado por _obtener_motor y cerrado al salir
+_MOTORES_ABIERTOS = {}
+_lock_motores = threading.Lock()
+
+def _obtener_motor(motor, velocidad, tono):
+    """Devuelve el VoiceEngine compartido de un motor, ajustando velocidad y tono si han cambiado."""
+    with _lock_motores:
+        voice = _MOTORES_ABIERTOS.get(motor)
+        if voice is None:
+            voice = _crear_motor(motor)
+            if not voice.iniciado:
+                raise RuntimeError(f"No se pudo iniciar el motor {motor}")
+            _MOTORES_ABIERTOS[motor] = voice
+    
+    # Ajustar en el propio motor en lugar de crear otro con los nuevos parámetros
+    if voice.config.get("velocidad") != velocidad:
+        voice.establecer_velocidad(velocidad)
+    if voice.config.get("tono") != tono:
+        voice.establecer_tono(tono)
+    return voice
+
+def _cerrar_motores_abiertos():
+    """Cierra todos los motores compartidos al terminar el programa."""
+    with _lock_motores:
+        motores = list(_MOTORES_ABIERTOS.values())
+        _MOTORES_ABIERTOS.clear()
+    
+    for voice in motores:
+        try:
+            voice.cerrar()
+        except Exception:
+            pass
+
+# Marcado mientras no haya un precalentamiento del motor en curso
+_motor_precalentado = threading.Event()
+_motor_precalentado.set()
+
+def _precalentar_motor():
+    """Prepara en segundo plano el motor predeterminado para que la primera prueba no espere a su inicio."""
+    motor = CONFIG.get("motor", OpcionMotor.PYTTSX3.value)
+    try:
+        # Los objetos SAPI5 de pyttsx3 solo sirven en el hilo COM que los crea:
+        # aquí se adelanta la importación y el motor se crea en el hilo principal
+        if motor == OpcionMotor.PYTTSX3.value:
+            if _cargar_voice_engine() is not None:
+                importlib.import_module("pyttsx3")
+            return
+        
+        voice = _obtener_motor(motor, CONFIG.get("velocidad", 1.0), CONFIG.get("tono", 0.0))
+        
+        # Si el motor de red no arrancó y se usó pyttsx3 como respaldo, no dejarlo para otro hilo
+        if voice.motor_actual.value == OpcionMotor.PYTTSX3.value:
+            with _lock_motores:
+                _MOTORES_ABIERTOS.pop(motor, None)
+            voice.cerrar()
+    except Exception as e:
+        print(f"NOTA: No se pudo precalentar el motor de voz: {e}")
+    finally:
+        _motor_precalentado.set()
+
+def _sintetizar_con_motor(voice, motor, texto, clave):
+    """Sintetiza el texto en el caché con un motor ya iniciado y devuelve la ruta o None."""
+    extension = voice.EXTENSIONES_AUDIO.get(voice.motor_actual)
+    if not extension or voice.motor_actual.value != motor:
+        return None
+    
+    ruta_cache = os.path.join(CACHE_AUDIO_DIR, clave + extension)
+    if not voice.sintetizar_a_archivo(texto, ruta_cache):
+        return None
+    
+    _guardar_metadatos_cache(clave, motor)
+    return ruta_cache
+
+def sintetizar_motor(motor, texto, usar_config_predeterminada=True):
+    """Sintetiza el texto con un motor a un archivo sin reproducirlo y devuelve su ruta o None."""
+    try:
+        clave = _clave_cache(motor, texto, CONFIG)
+        ruta_cache = _buscar_en_cache(clave)
+        if ruta_cache:
+            return ruta_cache
+        
+        voice = _crear_motor(motor, usar_config_predeterminada)
+        try:
+            if not voice.iniciado:
+                print(f"ERROR: No se pudo iniciar el motor {motor}")
+                return None
+            return _sintetizar_con_motor(voice, motor, texto, clave)
+        finally:
+            voice.cerrar()
+    except Exception as e:
+        print(f"ERROR al sintetizar con {motor}: {e}")
+        return None
+
+def reproducir_audio(ruta_audio):
+    """Reproduce un archivo de audio ya sintetizado."""
+    if _cargar_voice_engine() is None:
+        return False
+    return VoiceEngine.reproducir_archivo(ruta_audio)
+
+# Hilo de la reproducción en segundo plano en curso, si la hay
+_hilo_reproduccion = None
+
+def esperar_reproduccion():
+    """Espera a que termine la reproducción en segundo plano, si la hay."""
+    if _hilo_reproduccion is not None:
+        _hilo_reproduccion.join()
+
+def reproducir_audio_async(ruta_audio):
+    """Reproduce un archivo de audio en segundo plano, esperando antes a que acabe el anterior."""
+    global _hilo_reproduccion
+    esperar_reproduccion()
+    _hilo_reproduccion = threading.Thread(target=reproducir_audio, args=(ruta_audio,), daemon=True)
+    _hilo_reproduccion.start()
+
+def hablar_largo(voice, motor, texto):
+    """Reproduce un texto largo frase a frase, tomando del caché las frases ya sintetizadas."""
+    def sintetizar_frase(frase):
+        clave = _clave_cache(motor, frase, CONFIG)
+        return _buscar_en_cache(clave) or _sintetizar_con_motor(voice, motor, frase, clave)
+    
+    return voice.hablar_por_frases(texto, sintetizar_frase)
+
+def probar_motor(motor, texto, usar_config_predeterminada=True, por_frases=False):
     """Prueba un motor de voz específico con el texto dado."""
     try:
-        # Importar el motor de voz
-        from sistema.voice_engine import VoiceEngine
+        # Si este audio ya se sintetizó antes, reproducirlo sin iniciar el motor
+        clave = _clave_cache(motor, texto, CONFIG)
+        ruta_cache = _buscar_en_cache(clave)
+        if ruta_cache:
+            print(f"\nProbando motor: {motor} (audio en caché)")
+            return reproducir_audio(ruta_cache)
         
         if usar_config_predeterminada:
-            # Usar el archivo de configuración predeterminado
-            voice = VoiceEngine()
+            # Esperar al precalentamiento para no iniciar el mismo motor dos veces
+            _motor_precalentado.wait()
             
-            # Cambiar al motor deseado
-            if hasattr(voice, 'motor_actual') and getattr(voice, 'motor_actual', None) and voice.motor_actual.value != motor:
-                print(f"Cambiando motor a {motor}...")
-                voice.cambiar_motor(motor)
+            # Reutilizar el motor compartido si ya se creó
+            voice = _obtener_motor(motor, CONFIG.get("velocidad", 1.0), CONFIG.get("tono", 0.0))
         else:
-            # Configuración específica para el motor
-            import json
-            config_temp = "configuracion_voz_temp.json"
-            
-            # Crear config temporal con el motor específico
-            with open("configuracion_voz.json", "r", encoding="utf-8") as f:
-                config = json.load(f)
+            voice = _crear_motor(motor, usar_config_predeterminada=False)
             
-            config["motor"] = motor
-            
-            with open(config_temp, "w", encoding="utf-8") as f:
-                json.dump(config, f, indent=4)
-            
-            # Inicializar con la config temporal
-            voice = VoiceEngine(config_path=config_temp)
-        
-        if not voice.iniciado:
-            print(f"ERROR: No se pudo iniciar el motor {motor}")
-            return False
+            if not voice.iniciado:
+                print(f"ERROR: No se pudo iniciar el motor {motor}")
+                return False
         
         # Mostrar información
         print(f"\nProbando motor: {motor}")
         if hasattr(voice, 'motor_actual'):
             print(f"Motor actual: {voice.motor_actual}")
         
-        # Intentar hablar
+        # Intentar hablar, guardando el audio en caché si el motor lo permite
         print("Reproduciendo mensaje...")
-        voice.hablar_sincrono(texto)
-        
-        # Cerrar el motor
-        voice.cerrar()
+        if por_frases:
+            hablar_largo(voice, motor, texto)
+        else:
+            ruta_cache = _sintetizar_con_motor(voice, motor, texto, clave)
+            if ruta_cache:
+                voice.reproducir_archivo(ruta_cache)
+            else:
+                voice.hablar_sincrono(texto)
         
-        # Limpiar archivo temporal si se creó
+        # Cerrar el motor si no es reutilizable
         if not usar_config_predeterminada:
-            try:
-                os.remove(config_temp)
-            except:
-                pass
+            voice.cerrar()
             
         return True
     except Exception as e:
         print(f"ERROR al probar {motor}: {e}")
         return False
 
+def _verificar_entorno():
+    """Comprueba una sola vez qué motores están instalados y devuelve un diccionario motor -> disponible."""
+    # Sin importar los módulos; cada motor se carga al usarlo
+    pyttsx3_disponible = _modulo_instalado("pyttsx3")
+    if not pyttsx3_disponible:
+        print("NOTA: pyttsx3 no está instalado. Instálalo con: pip install pyttsx3")
+    
+    google_tts_disponible = _modulo_instalado("google.cloud.texttospeech")
+    if google_tts_disponible:
+        # Verificar credenciales
+        credenciales_path = CONFIG.get("google_tts", {}).get("credenciales_path")
+        
+        if credenciales_path and not os.path.exists(credenciales_path):
+            print(f"ADVERTENCIA: No se encontró el archivo de credenciales {credenciales_path}")
+            print("Verifica que el archivo existe y está en la ubicación correcta.")
+    else:
+        print("NOTA: google-cloud-texttospeech no está instalado. Instálalo con: pip install google-cloud-texttospeech")
+    
+    gtts_disponible = _modulo_instalado("gtts")
+    if gtts_disponible:
+        print("gTTS está disponible. ¡Excelente!")
+    else:
+        print("NOTA: gTTS no está instalado. Instálalo con: pip install gtts")
+    
+    return {
+        OpcionMotor.PYTTSX3.value: pyttsx3_disponible,
+        OpcionMotor.GOOGLE.value: google_tts_disponible,
+        OpcionMotor.GTTS.value: gtts_disponible
+    }
+
+def _probar_motor_elegido(eleccion, texto, motores_disponibles, **kwargs):
+    """Prueba el motor elegido en un submenú (1-3) si está disponible."""
+    motor = MOTORES_MENU.get(eleccion.strip(), (None,))[0]
+    if motor in motores_disponibles.values():
+        probar_motor(motor, texto, **kwargs)
+    else:
+        print("Opción no válida o motor no disponible.")
+
+class MenuComparacion(cmd.Cmd):
+    """Menú interactivo de la comparación; cada opción numérica es un comando do_N."""
+    
+    prompt = "\nSelecciona una opción (1-9): "
+    
+    def __init__(self, disponibles, motores_disponibles):
+        super().__init__()
+        self.disponibles = disponibles
+        self.motores_disponibles = motores_disponibles
+    
+    def _mostrar_menu(self):
+        sys.stdout.write(MENU_COMPARACION + "\n")
+        sys.stdout.flush()
+    
+    def preloop(self):
+        self._mostrar_menu()
+    
+    def precmd(self, line):
+        # Releer la configuración solo si el motor de voz la ha cambiado en disco
+        _cargar_config_voz()
+        return line.strip()
+    
+    def postcmd(self, stop, line):
+        if not stop:
+            self._mostrar_menu()
+        return stop
+    
+    def onecmd(self, line):
+        try:
+            return super().onecmd(line)
+        except Exception as e:
+            print(f"Error: {e}")
+            return False
+    
+    def emptyline(self):
+        self.default("")
+    
+    def default(self, line):
+        print("Por favor, introduce un número del 1 al 9.")
+    
+    def _probar_opcion_motor(self, opcion):
+        """Opciones 1-3: prueba un motor concreto con el texto corto y pide su valoración."""
+        motor, nombre, paquete = MOTORES_MENU[opcion]
+        if self.disponibles[motor]:
+            probar_motor(motor, TEXTO_PRUEBA_CORTO)
+            valoracion = input("\n¿Cómo calificarías esta voz del 1 al 10? ")
+            print(f"Has valorado {nombre} con: {valoracion}/10")
+        else:
+            print(f"{nombre} no está disponible. Instálalo con: pip install {paquete}")
+    
+    def do_1(self, arg):
+        """Probar pyttsx3 (voz básica, sin internet)."""
+        self._probar_opcion_motor("1")
+    
+    def do_2(self, arg):
+        """Probar Google TTS (alta calidad, requiere internet y credenciales)."""
+        self._probar_opcion_motor("2")
+    
+    def do_3(self, arg):
+        """Probar gTTS (buena calidad, gratuito)."""
+        self._probar_opcion_motor("3")
+    
+    def do_4(self, arg):
+        """Comparación directa de todos los motores disponibles."""
+        print("\n===== COMPARACIÓN DIRECTA =====")
+        print("Se reproducirá el mismo texto con cada motor disponible.")
+        
+        resultados = {}
+        
+        motores_comparar = list(self.motores_disponibles.items())
+        
+        # Los motores de red se sintetizan por adelantado, uno por hilo, y se
+        # reproducen en orden; pyttsx3 se sintetiza en el hilo principal al
+        # llegar su turno, porque sus objetos SAPI5 (COM) solo sirven en el
+        # hilo que los crea
+        motores_red = [motor for _, motor in motores_comparar if motor != OpcionMotor.PYTTSX3.value]
+        with ThreadPoolExecutor(max_workers=max(1, len(motores_red))) as executor:
+            futuros = {
+                motor: executor.submit(sintetizar_motor, motor, TEXTO_PRUEBA_CORTO, False)
+                for motor in motores_red
+            }
+            
+            for nombre, motor in motores_comparar:
+                print(f"\n----- {nombre} -----")
+                if motor in futuros:
+                    ruta_audio = futuros.pop(motor).result()
+                else:
+                    ruta_audio = sintetizar_motor(motor, TEXTO_PRUEBA_CORTO, False)
+                if ruta_audio:
+                    # Reproducir sin bloquear para que la siguiente síntesis y
+                    # la petición de valoración se solapen con el audio
+                    reproducir_audio_async(ruta_audio)
+                else:
+                    # El motor no puede sintetizar a archivo; hablar directamente
+                    esperar_reproduccion()
+                    probar_motor(motor, TEXTO_PRUEBA_CORTO)
+                valoracion = input("Valoración (1-10): ")
+                resultados[nombre] = valoracion
+            
+            esperar_reproduccion()
+        
+        # Mostrar resultados
+        print("\n".join(
+            ["\n===== RESULTADOS DE LA COMPARACIÓN ====="] +
+            [f"{motor}: {valor}/10" for motor, valor in resultados.items()]
+        ))
+        
+        # Determinar el mejor, convirtiendo las valoraciones una sola vez
+        if not resultados:
+            return
+        
+        # Las valoraciones no numéricas se descartan sin pasar por excepciones
+        valoraciones = {nombre: int(valor) for nombre, valor in resultados.items()
+                        if valor.strip().isdigit()}
+        for nombre in resultados.keys() - valoraciones.keys():
+            print(f"Valoración inválida para {nombre}: {resultados[nombre]!r}")
+        if not valoraciones:
+            print("No se pudo determinar el mejor motor.")
+            return
+        
+        mejor_motor = max(valoraciones, key=valoraciones.get)
+        print(f"\nEl mejor motor según tu valoración es: {mejor_motor} con {valoraciones[mejor_motor]}/10")
+        
+        guardar_mejor = input("\n¿Quieres configurar este motor como predeterminado? (s/n): ").lower()
+        if guardar_mejor == 's':
+            motor_config = self.motores_disponibles.get(mejor_motor)
+                
+            if motor_config:
+                try:
+                    CONFIG["motor"] = motor_config
+                    _guardar_config_voz()
+                    
+                    print(f"Motor {motor_config} configurado como predeterminado.")
+                except Exception as e:
+                    print(f"Error al guardar configuración: {e}")
+    
+    def do_5(self, arg):
+        """Prueba avanzada (texto largo)."""
+        print("\n===== PRUEBA AVANZADA =====")
+        print("Se reproducirá un texto más largo con cada motor.")
+        
+        motor_elegido = input("¿Qué motor quieres probar? (1: pyttsx3, 2: Google TTS, 3: gTTS): ")
+        
+        _probar_motor_elegido(motor_elegido, TEXTO_PRUEBA_LARGO, self.motores_disponibles, por_frases=True)
+    
+    def do_6(self, arg):
+        """Prueba de saludos del sistema."""
+        print("\n===== PRUEBA DE SALUDOS DEL SISTEMA =====")
+        
+        motor_elegido = input("¿Qué motor quieres probar? (1: pyttsx3, 2: Google TTS, 3: gTTS): ")
+        
+        _probar_motor_elegido(motor_elegido, TEXTO_SALUDOS, self.motores_disponibles)
+    
+    def do_7(self, arg):
+        """Modificar velocidad/tono."""
+        print("\n===== MODIFICAR VELOCIDAD/TONO =====")
+        
+        # Reutilizar el motor predeterminado compartido en lugar de crear uno nuevo
+        _motor_precalentado.wait()
+        try:
+            voice = _obtener_motor(CONFIG.get("motor", OpcionMotor.PYTTSX3.value),
+                                   CONFIG.get("velocidad", 1.0), CONFIG.get("tono", 0.0))
+        except RuntimeError:
+            print("ERROR: No se pudo iniciar el motor de voz")
+            return
+        
+        print(f"Motor actual: {voice.motor_actual}")
+        print(f"Velocidad actual: {voice.config.get('velocidad', 1.0)}")
+        print(f"Tono actual: {voice.config.get('tono', 0.0)}")
+        
+        # Modificar parámetros
+        try:
+            nueva_velocidad = float(input("Nueva velocidad (0.5-2.0, 1.0=normal): "))
+            nuevo_tono = float(input("Nuevo tono (-10.0-10.0, 0.0=normal): "))
+            
+            voice.establecer_velocidad(nueva_velocidad)
+            voice.establecer_tono(nuevo_tono)
+            
+            # El motor ya los guarda en disco; mantener CONFIG al día
+            CONFIG["velocidad"] = voice.config.get("velocidad", nueva_velocidad)
+            CONFIG["tono"] = voice.config.get("tono", nuevo_tono)
+            
+            print("Reproduciendo con nuevos parámetros...")
+            voice.hablar_sincrono(TEXTO_PRUEBA_CORTO)
+            
+            guardar = input("¿Guardar estos parámetros como predeterminados? (s/n): ").lower()
+            if guardar == 's':
+                # Ya se ha guardado en el motor
+                print("Parámetros guardados como predeterminados.")
+        except ValueError:
+            print("Error: Introduce valores numéricos válidos.")
+        except Exception as e:
+            print(f"Error: {e}")
+    
+    def do_8(self, arg):
+        """Configurar gTTS como predeterminado."""
+        if not self.disponibles[OpcionMotor.GTTS.value]:
+            print("gTTS no está disponible. Instálalo con: pip install gtts")
+            return
+        
+        # Configurar gTTS como motor predeterminado
+        try:
+            CONFIG["motor"] = "gtts"
+            _guardar_config_voz()
+            
+            print("gTTS configurado como motor predeterminado.")
+            
+            # Probar el motor
+            probar_motor(OpcionMotor.GTTS.value, "gTTS ha sido configurado como el motor de voz predeterminado para el sistema.")
+        except Exception as e:
+            print(f"Error al configurar gTTS como predeterminado: {e}")
+    
+    def do_9(self, arg):
+        """Salir."""
+        print("Saliendo del programa...")
+        return True
+    
+    def do_EOF(self, arg):
+        """Salir al cerrar la entrada (Ctrl+D / Ctrl+Z)."""
+        print()
+        return self.do_9(arg)
+
 def comparar_motores():
     """Función principal para comparar los diferentes motores de voz."""
-    print("===== COMPARACIÓN DE MOTORES DE VOZ MEJORADA =====")
-    print("Este script te permitirá probar y comparar los diferentes motores de voz disponibles.")
-    print("Ahora incluye gTTS, un motor gratuito de alta calidad de Google Translate.")
+    print(BANNER_COMPARACION)
     
     # Verificar si existe el archivo de configuración
-    if not os.path.exists("configuracion_voz.json"):
+    _cargar_config_voz()
+    if not _config_existe:
         print("ADVERTENCIA: No se encontró el archivo configuracion_voz.json")
         print("Creando archivo de configuración básico...")
         
-        import json
         config_basica = {
             "motor": "gtts",
             "voz_genero": "femenino",
@@ -136,260 +749,30 @@ def comparar_motores():
             }
         }
         
-        with open("configuracion_voz.json", "w", encoding="utf-8") as f:
-            json.dump(config_basica, f, indent=4)
+        CONFIG.update(config_basica)
+        _guardar_config_voz()
     
-    # Verificar dependencias
-    try:
-        import pyttsx3
-        pyttsx3_disponible = True
-    except ImportError:
-        pyttsx3_disponible = False
-        print("NOTA: pyttsx3 no está instalado. Instálalo con: pip install pyttsx3")
+    # Iniciar el motor predeterminado mientras se comprueban las dependencias
+    _motor_precalentado.clear()
+    threading.Thread(target=_precalentar_motor, daemon=True).start()
     
-    try:
-        from google.cloud import texttospeech
-        google_tts_disponible = True
-        
-        # Verificar credenciales
-        credenciales_path = None
-        try:
-            import json
-            with open("configuracion_voz.json", "r", encoding="utf-8") as f:
-                config = json.load(f)
-                credenciales_path = config.get("google_tts", {}).get("credenciales_path")
-        except:
-            pass
-            
-        if credenciales_path and not os.path.exists(credenciales_path):
-            print(f"ADVERTENCIA: No se encontró el archivo de credenciales {credenciales_path}")
-            print("Verifica que el archivo existe y está en la ubicación correcta.")
-    except ImportError:
-        google_tts_disponible = False
-        print("NOTA: google-cloud-texttospeech no está instalado. Instálalo con: pip install google-cloud-texttospeech")
+    # Verificar dependencias una sola vez
+    disponibles = _verificar_entorno()
     
-    try:
-        from gtts import gTTS
-        gtts_disponible = True
-        print("gTTS está disponible. ¡Excelente!")
-    except ImportError:
-        gtts_disponible = False
-        print("NOTA: gTTS no está instalado. Instálalo con: pip install gtts")
+    # Motores disponibles en orden de menú (nombre -> motor), calculado una vez
+    # y compartido por las opciones 4, 5 y 6
+    motores_disponibles = {
+        nombre: motor for motor, nombre, _ in MOTORES_MENU.values() if disponibles[motor]
+    }
     
     # Mostrar motores disponibles
-    print("\nMotores disponibles:")
-    print(f" - pyttsx3 (básico): {'Disponible' if pyttsx3_disponible else 'No disponible'}")
-    print(f" - Google TTS (alta calidad, pago): {'Disponible' if google_tts_disponible else 'No disponible'}")
-    print(f" - gTTS (Google Translate, gratuito): {'Disponible' if gtts_disponible else 'No disponible'}")
+    print(PLANTILLA_MOTORES_DISPONIBLES.format(**{
+        motor: "Disponible" if disponible else "No disponible" for motor, disponible in disponibles.items()
+    }))
     
     # Menú de prueba
-    while True:
-        print("\n===== MENÚ DE COMPARACIÓN =====")
-        print("1. Probar pyttsx3 (voz básica, sin internet)")
-        print("2. Probar Google TTS (alta calidad, requiere internet y credenciales)")
-        print("3. Probar gTTS (buena calidad, gratuito)")
-        print("4. Comparación directa de todos los motores disponibles")
-        print("5. Prueba avanzada (texto largo)")
-        print("6. Prueba de saludos del sistema")
-        print("7. Modificar velocidad/tono")
-        print("8. Configurar gTTS como predeterminado")
-        print("9. Salir")
-        
-        try:
-            opcion = int(input("\nSelecciona una opción (1-9): "))
-            
-            if opcion == 1:
-                if pyttsx3_disponible:
-                    probar_motor(OpcionMotor.PYTTSX3.value, TEXTO_PRUEBA_CORTO)
-                    valoracion = input("\n¿Cómo calificarías esta voz del 1 al 10? ")
-                    print(f"Has valorado pyttsx3 con: {valoracion}/10")
-                else:
-                    print("pyttsx3 no está disponible. Instálalo con: pip install pyttsx3")
-            
-            elif opcion == 2:
-                if google_tts_disponible:
-                    probar_motor(OpcionMotor.GOOGLE.value, TEXTO_PRUEBA_CORTO)
-                    valoracion = input("\n¿Cómo calificarías esta voz del 1 al 10? ")
-                    print(f"Has valorado Google TTS con: {valoracion}/10")
-                else:
-                    print("Google TTS no está disponible. Instálalo con: pip install google-cloud-texttospeech")
-            
-            elif opcion == 3:
-                if gtts_disponible:
-                    probar_motor(OpcionMotor.GTTS.value, TEXTO_PRUEBA_CORTO)
-                    valoracion = input("\n¿Cómo calificarías esta voz del 1 al 10? ")
-                    print(f"Has valorado gTTS con: {valoracion}/10")
-                else:
-                    print("gTTS no está disponible. Instálalo con: pip install gtts")
-            
-            elif opcion == 4:
-                print("\n===== COMPARACIÓN DIRECTA =====")
-                print("Se reproducirá el mismo texto con cada motor disponible.")
-                
-                resultados = {}
-                
-                if pyttsx3_disponible:
-                    print("\n----- pyttsx3 -----")
-                    probar_motor(OpcionMotor.PYTTSX3.value, TEXTO_PRUEBA_CORTO)
-                    valoracion = input("Valoración (1-10): ")
-                    resultados["pyttsx3"] = valoracion
-                
-                if google_tts_disponible:
-                    print("\n----- Google TTS -----")
-                    probar_motor(OpcionMotor.GOOGLE.value, TEXTO_PRUEBA_CORTO)
-                    valoracion = input("Valoración (1-10): ")
-                    resultados["Google TTS"] = valoracion
-                
-                if gtts_disponible:
-                    print("\n----- gTTS -----")
-                    probar_motor(OpcionMotor.GTTS.value, TEXTO_PRUEBA_CORTO)
-                    valoracion = input("Valoración (1-10): ")
-                    resultados["gTTS"] = valoracion
-                
-                # Mostrar resultados
-                print("\n===== RESULTADOS DE LA COMPARACIÓN =====")
-                for motor, valor in resultados.items():
-                    print(f"{motor}: {valor}/10")
-                
-                # Determinar el mejor
-                if resultados:
-                    try:
-                        mejor_motor = max(resultados.items(), key=lambda x: int(x[1]))
-                        print(f"\nEl mejor motor según tu valoración es: {mejor_motor[0]} con {mejor_motor[1]}/10")
-                        
-                        guardar_mejor = input("\n¿Quieres configurar este motor como predeterminado? (s/n): ").lower()
-                        if guardar_mejor == 's':
-                            motor_config = None
-                            if mejor_motor[0] == "pyttsx3":
-                                motor_config = "pyttsx3"
-                            elif mejor_motor[0] == "Google TTS":
-                                motor_config = "google_tts"
-                            elif mejor_motor[0] == "gTTS":
-                                motor_config = "gtts"
-                                
-                            if motor_config:
-                                import json
-                                try:
-                                    with open("configuracion_voz.json", "r", encoding="utf-8") as f:
-                                        config = json.load(f)
-                                    
-                                    config["motor"] = motor_config
-                                    
-                                    with open("configuracion_voz.json", "w", encoding="utf-8") as f:
-                                        json.dump(config, f, indent=4)
-                                    
-                                    print(f"Motor {motor_config} configurado como predeterminado.")
-                                except Exception as e:
-                                    print(f"Error al guardar configuración: {e}")
-                    except:
-                        print("No se pudo determinar el mejor motor.")
-            
-            elif opcion == 5:
-                print("\n===== PRUEBA AVANZADA =====")
-                print("Se reproducirá un texto más largo con cada motor.")
-                
-                motor_elegido = input("¿Qué motor quieres probar? (1: pyttsx3, 2: Google TTS, 3: gTTS): ")
-                
-                if motor_elegido == "1" and pyttsx3_disponible:
-                    probar_motor(OpcionMotor.PYTTSX3.value, TEXTO_PRUEBA_LARGO)
-                elif motor_elegido == "2" and google_tts_disponible:
-                    probar_motor(OpcionMotor.GOOGLE.value, TEXTO_PRUEBA_LARGO)
-                elif motor_elegido == "3" and gtts_disponible:
-                    probar_motor(OpcionMotor.GTTS.value, TEXTO_PRUEBA_LARGO)
-                else:
-                    print("Opción no válida o motor no disponible.")
-            
-            elif opcion == 6:
-                print("\n===== PRUEBA DE SALUDOS DEL SISTEMA =====")
-                
-                motor_elegido = input("¿Qué motor quieres probar? (1: pyttsx3, 2: Google TTS, 3: gTTS): ")
-                
-                if motor_elegido == "1" and pyttsx3_disponible:
-                    probar_motor(OpcionMotor.PYTTSX3.value, TEXTO_SALUDOS)
-                elif motor_elegido == "2" and google_tts_disponible:
-                    probar_motor(OpcionMotor.GOOGLE.value, TEXTO_SALUDOS)
-                elif motor_elegido == "3" and gtts_disponible:
-                    probar_motor(OpcionMotor.GTTS.value, TEXTO_SALUDOS)
-                else:
-                    print("Opción no válida o motor no disponible.")
-            
-            elif opcion == 7:
-                print("\n===== MODIFICAR VELOCIDAD/TONO =====")
-                
-                # Importar motor de voz
-                from sistema.voice_engine import VoiceEngine
-                voice = VoiceEngine()
-                
-                if not voice.iniciado:
-                    print("ERROR: No se pudo iniciar el motor de voz")
-                    continue
-                
-                print(f"Motor actual: {voice.motor_actual}")
-                print(f"Velocidad actual: {voice.config.get('velocidad', 1.0)}")
-                print(f"Tono actual: {voice.config.get('tono', 0.0)}")
-                
-                # Modificar parámetros
-                try:
-                    nueva_velocidad = float(input("Nueva velocidad (0.5-2.0, 1.0=normal): "))
-                    nuevo_tono = float(input("Nuevo tono (-10.0-10.0, 0.0=normal): "))
-                    
-                    voice.establecer_velocidad(nueva_velocidad)
-                    voice.establecer_tono(nuevo_tono)
-                    
-                    print("Reproduciendo con nuevos parámetros...")
-                    voice.hablar_sincrono(TEXTO_PRUEBA_CORTO)
-                    
-                    guardar = input("¿Guardar estos parámetros como predeterminados? (s/n): ").lower()
-                    if guardar == 's':
-                        # Ya se ha guardado en el motor
-                        print("Parámetros guardados como predeterminados.")
-                except ValueError:
-                    print("Error: Introduce valores numéricos válidos.")
-                except Exception as e:
-                    print(f"Error: {e}")
-                
-                voice.cerrar()
-            
-            elif opcion == 8:
-                if gtts_disponible:
-                    # Configurar gTTS como motor predeterminado
-                    import json
-                    try:
-                        with open("configuracion_voz.json", "r", encoding="utf-8") as f:
-                            config = json.load(f)
-                        
-                        config["motor"] = "gtts"
-                        
-                        with open("configuracion_voz.json", "w", encoding="utf-8") as f:
-                            json.dump(config, f, indent=4)
-                        
-                        print("gTTS configurado como motor predeterminado.")
-                        
-                        # Probar el motor
-                        probar_motor(OpcionMotor.GTTS.value, "gTTS ha sido configurado como el motor de voz predeterminado para el sistema.")
-                    except Exception as e:
-                        print(f"Error al configurar gTTS como predeterminado: {e}")
-                else:
-                    print("gTTS no está disponible. Instálalo con: pip install gtts")
-            
-            elif opcion == 9:
-                print("Saliendo del programa...")
-                break
-            
-            else:
-                print("Opción no válida. Intenta de nuevo.")
-        
-        except ValueError:
-            print("Por favor, introduce un número del 1 al 9.")
-        except Exception as e:
-            print(f"Error: {e}")
-    
-    # Limpiar archivos temporales
-    try:
-        if os.path.exists("configuracion_voz_temp.json"):
-            os.remove("configuracion_voz_temp.json")
-    except:
-        pass
+    MenuComparacion(disponibles, motores_disponibles).cmdloop()
 
 if __name__ == "__main__":
+    _bootstrap()
     comparar_motores()
\ No newline at end of file
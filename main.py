@@ -5,29 +5,51 @@ Este archivo sirve como punto de entrada al sistema completo.
 """
 
 import logging
+import logging.handlers
+import queue
 import argparse
+import traceback
 from sistema import SistemaInteractivo
 
-def configurar_argumentos():
-    """Configura los argumentos de línea de comandos para el sistema."""
+def _crear_parser():
+    """Construye el parser de argumentos de línea de comandos."""
     parser = argparse.ArgumentParser(description='Sistema Interactivo con Kinect')
     parser.add_argument('--debug', action='store_true', help='Activar modo debug')
     parser.add_argument('--config', type=str, help='Ruta al archivo de configuración')
     parser.add_argument('--webcam', action='store_true', help='Usar webcam en lugar de Kinect')
     parser.add_argument('--puerto', type=str, help='Puerto para la mano robótica')
-    return parser.parse_args()
+    return parser
+
+# El parser se construye una sola vez por proceso y se reutiliza en cada llamada
+PARSER = _crear_parser()
+
+def configurar_argumentos(argv=None):
+    """Configura los argumentos de línea de comandos para el sistema."""
+    return PARSER.parse_args(argv)
+
+def configurar_logging():
+    """Configura el logging para que la escritura a disco y consola ocurra en un hilo aparte."""
+    formato = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    handlers = [
+        logging.FileHandler("sistema_kinect.log"),
+        logging.StreamHandler()
+    ]
+    for handler in handlers:
+        handler.setFormatter(formato)
+
+    # El bucle principal solo encola los registros; el listener los escribe
+    cola_logs = queue.SimpleQueue()
+    handler_cola = logging.handlers.QueueHandler(cola_logs)
+    handler_cola.setFormatter(logging.Formatter('%(message)s'))
+    logging.basicConfig(level=logging.INFO, handlers=[handler_cola])
+    listener = logging.handlers.QueueListener(cola_logs, *handlers)
+    listener.start()
+    return listener
 
 def main():
     """Función principal del programa."""
     # Configurar logging
-    logging.basicConfig(
-        level=logging.INFO,
-        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-        handlers=[
-            logging.FileHandler("sistema_kinect.log"),
-            logging.StreamHandler()
-        ]
-    )
+    listener_logs = configurar_logging()
     logger = logging.getLogger("Main")
     
     # Procesar argumentos de línea de comandos
@@ -49,10 +71,10 @@ def main():
         logger.info("Programa terminado por el usuario.")
     except Exception as e:
         logger.error(f"Error al iniciar el sistema: {e}")
-        import traceback
         traceback.print_exc()
     finally:
         logger.info("Programa finalizado.")
+        listener_logs.stop()
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -2,17 +2,36 @@
 Módulo principal del Sistema Interactivo con Kinect.
 """
 
-# Importación de todos los módulos necesarios
-from .config_manager import ConfigManager
-from .kinect_manager import KinectManager
-from .hand_tracker import HandTracker
-from .mano_robotica import ManoRoboticaManager
-from .text_recognizer import TextRecognizer
-from .voice_engine import VoiceEngine
-from .ui_manager import UIManager
-from .dibujo_manager import DibujoManager
-from .asistente_virtual import AsistenteVirtual
-from .sistema_interactivo import SistemaInteractivo
+import importlib
+
+# Submódulo en el que vive cada clase exportada; se importan la primera vez
+# que se accede a ellas, así que usar una sola clase (por ejemplo VoiceEngine)
+# no arrastra OpenCV, Kinect ni el resto de dependencias
+_MODULOS_CLASES = {
+    'ConfigManager': '.config_manager',
+    'KinectManager': '.kinect_manager',
+    'HandTracker': '.hand_tracker',
+    'ManoRoboticaManager': '.mano_robotica',
+    'TextRecognizer': '.text_recognizer',
+    'VoiceEngine': '.voice_engine',
+    'UIManager': '.ui_manager',
+    'DibujoManager': '.dibujo_manager',
+    'AsistenteVirtual': '.asistente_virtual',
+    'SistemaInteractivo': '.sistema_interactivo'
+}
+
+def __getattr__(nombre):
+    """Importa bajo demanda las clases exportadas por el paquete."""
+    if nombre not in _MODULOS_CLASES:
+        raise AttributeError(f"module {__name__!r} has no attribute {nombre!r}")
+
+    modulo = importlib.import_module(_MODULOS_CLASES[nombre], __name__)
+    clase = getattr(modulo, nombre)
+    globals()[nombre] = clase
+    return clase
+
+def __dir__():
+    return sorted(list(globals()) + list(_MODULOS_CLASES))
 
 # Exportar clases para que sean accesibles directamente desde el módulo
 __all__ = [
@@ -1,20 +1,41 @@
 """
 Módulo de asistente virtual con personalidad para el sistema interactivo.
+
+Todo el trabajo de este módulo es manejo de cadenas y diccionarios, sin bucles
+numéricos, así que no se compila con Numba ni Cython: solo añadiría tiempo de importación.
 """
 
 import logging
 import random
+import sys
 import json
 import os
-from typing import Dict, List, Optional
-from enum import Enum
 import time
+import threading
+import functools
+from collections import OrderedDict, deque
+from typing import Dict, List, Optional, Tuple
+from enum import Enum
+
+# orjson es opcional; acelera la lectura y escritura de la configuración
+try:
+    import orjson
+    ORJSON_DISPONIBLE = True
+except ImportError:
+    ORJSON_DISPONIBLE = False
 
 from .efectos_sonido import GestorEfectosSonido, TipoEfecto
 from .voz_emotiva import GestorVozEmotiva, Emocion
 
 logger = logging.getLogger("SistemaKinect.AsistenteVirtual")
 
+# Referencias locales para las rutas que se ejecutan con cada frase
+_time_time = time.time
+_random_choice = random.choice
+
+# Frases para una categoría inexistente o sin entradas
+_SIN_FRASES = ("Mensaje no disponible",)
+
 class NivelVerbosidad(Enum):
     SILENCIOSO = 0
     MINIMO = 1
@@ -30,11 +51,45 @@ class PersonalidadAsistente(Enum):
     ARTISTA = "artista"
     MOTIVADOR = "motivador"
 
+def _internar_frases(frases: Dict) -> Dict:
+    """Valida FRASES e interna categorías, personalidades y plantillas, guardándolas como tuplas."""
+    internadas = {}
+    for categoria, valor in frases.items():
+        if isinstance(valor, dict):
+            # "amigable" es el respaldo de las personalidades sin frases propias
+            if not valor.get("amigable"):
+                raise ValueError(f"La categoría de frases '{categoria}' no tiene frases 'amigable'")
+            valor = {sys.intern(personalidad): tuple(sys.intern(frase) for frase in lista)
+                     for personalidad, lista in valor.items()}
+        else:
+            valor = tuple(sys.intern(frase) for frase in valor)
+        internadas[sys.intern(categoria)] = valor
+    return internadas
+
+def _aplanar_frases(frases: Dict) -> Dict[Tuple[str, str], Tuple[str, ...]]:
+    """Convierte FRASES en un diccionario (categoría, personalidad) -> tupla con el respaldo ya resuelto."""
+    planas = {}
+    for categoria, valor in frases.items():
+        for personalidad in PersonalidadAsistente:
+            if isinstance(valor, dict):
+                lista = valor.get(personalidad.value) or valor["amigable"]
+            else:
+                lista = valor
+            planas[(categoria, personalidad.value)] = lista or _SIN_FRASES
+    return planas
+
+@functools.lru_cache(maxsize=None)
+def _resolver_frases(personalidad: str) -> Dict[str, Tuple[str, ...]]:
+    """Devuelve las frases de cada categoría para una personalidad (compartido, no modificar)."""
+    return {categoria: frases
+            for (categoria, personalidad_frases), frases in AsistenteVirtual.FRASES_PLANAS.items()
+            if personalidad_frases == personalidad}
+
 class AsistenteVirtual:
     """Gestiona un asistente virtual con personalidad para el sistema."""
     
     # Frases predefinidas para diferentes situaciones
-    FRASES = {
+    FRASES = _internar_frases({
         "saludo_inicial": {
             "profesional": ["Bienvenido al Sistema Interactivo con Kinect. Estoy listo para asistirle."],
             "amigable": ["¡Hola! Bienvenido al Sistema Interactivo. Estoy aquí para ayudarte."],
@@ -147,8 +202,31 @@ class AsistenteVirtual:
             "artista": ["A veces el arte es impredecible. Intentemos de nuevo."],
             "motivador": ["¡No pasa nada! Los errores son oportunidades de aprender."]
         }
+    })
+    
+    # FRASES aplanado una sola vez al cargar la clase
+    FRASES_PLANAS = _aplanar_frases(FRASES)
+    
+    # Efecto de sonido asociado a cada categoría de mensaje
+    EFECTOS_CATEGORIA = {
+        "saludo": TipoEfecto.BIENVENIDA,
+        "despedida": TipoEfecto.DESPEDIDA,
+        "modo": TipoEfecto.CAMBIO_MODO,
+        "navegacion": TipoEfecto.HOVER,
+        "accion": TipoEfecto.CLICK,
+        "trazo_inicio": TipoEfecto.TRAZO_INICIO,
+        "trazo_fin": TipoEfecto.TRAZO_FIN,
+        "guardado": TipoEfecto.GUARDADO,
+        "error": TipoEfecto.ERROR,
+        "exito": TipoEfecto.EXITO
     }
     
+    # Número máximo de frases formateadas que se conservan en memoria (las menos usadas salen antes)
+    MAX_CACHE_FORMATO = 64
+    
+    # Nombre de cada nivel de verbosidad, indexado por su valor
+    NOMBRES_VERBOSIDAD = ("silencioso", "mínimo", "normal", "detallado", "máximo")
+    
     def __init__(self, voice_engine, config_path="configuracion_asistente.json"):
         self.voice_engine = voice_engine
         self.config_path = config_path
@@ -156,13 +234,26 @@ class AsistenteVirtual:
         
         # Estado del asistente
         self.personalidad = PersonalidadAsistente(self.config.get("personalidad", "amigable"))
+        self._frases_activas: Dict[str, Tuple[str, ...]] = {}
+        self._cache_formato: "OrderedDict[Tuple[str, tuple], str]" = OrderedDict()
+        self._reconstruir_indice_frases()
         self.nivel_verbosidad = NivelVerbosidad(self.config.get("nivel_verbosidad", 2))
+        self._prioridad_minima = 4 - self.nivel_verbosidad.value
         self.activo = self.config.get("activo", True)
-        self.historial_frases = []
+        self.historial_frases = deque(maxlen=100)
         self.ultima_accion = None
+        self._ultimo_boton_hover: Optional[str] = None
+        self._temporizadores: List[threading.Timer] = []
+        self._lock_temporizadores = threading.Lock()
         self.contador_consejos = 0
+        self._ultimo_minuto_estadisticas = -1
         self.modo_tutorial = self.config.get("modo_tutorial", False)
         
+        # Los cambios de configuración se escriben agrupados, no en cada setter
+        self._config_pendiente = False
+        self._temporizador_config: Optional[threading.Timer] = None
+        self._lock_config = threading.Lock()
+        
         # Configuraciones específicas
         self.repetir_instrucciones = self.config.get("repetir_instrucciones", True)
         self.tiempo_entre_consejos = self.config.get("tiempo_entre_consejos", 60)
@@ -207,8 +298,9 @@ class AsistenteVirtual:
         
         try:
             if os.path.exists(self.config_path):
-                with open(self.config_path, 'r', encoding='utf-8') as f:
-                    config = json.load(f)
+                with open(self.config_path, 'rb') as f:
+                    datos = f.read()
+                config = orjson.loads(datos) if ORJSON_DISPONIBLE else json.loads(datos)
                 return {**config_default, **config}
             return config_default
         except Exception as e:
@@ -231,43 +323,84 @@ class AsistenteVirtual:
                 "usar_voz_emotiva": self.usar_voz_emotiva
             }
             
-            with open(self.config_path, 'w', encoding='utf-8') as f:
-                json.dump(config, f, indent=4)
+            if ORJSON_DISPONIBLE:
+                datos = orjson.dumps(config, option=orjson.OPT_INDENT_2)
+            else:
+                datos = json.dumps(config, indent=4).encode('utf-8')
+            
+            # Escribir en un temporal y reemplazar para no dejar el archivo a medias
+            ruta_tmp = self.config_path + '.tmp'
+            with open(ruta_tmp, 'wb') as f:
+                f.write(datos)
+            os.replace(ruta_tmp, self.config_path)
         except Exception as e:
             logger.error(f"Error al guardar configuración del asistente: {e}")
     
+    def _reconstruir_indice_frases(self) -> None:
+        """Resuelve FRASES para la personalidad actual en un diccionario categoría -> tupla de frases."""
+        self._frases_activas = _resolver_frases(self.personalidad.value)
+        self._cache_formato = OrderedDict()
+    
+    def _marcar_config_pendiente(self) -> None:
+        """Marca la configuración como modificada y la guarda tras 500 ms sin nuevos cambios."""
+        with self._lock_config:
+            self._config_pendiente = True
+            if self._temporizador_config is not None:
+                self._temporizador_config.cancel()
+            self._temporizador_config = threading.Timer(0.5, self.guardar_config_pendiente)
+            self._temporizador_config.daemon = True
+            self._temporizador_config.start()
+    
+    def guardar_config_pendiente(self) -> None:
+        """Guarda la configuración si hay cambios pendientes."""
+        with self._lock_config:
+            if not self._config_pendiente:
+                return
+            self._config_pendiente = False
+            if self._temporizador_config is not None:
+                self._temporizador_config.cancel()
+                self._temporizador_config = None
+            self._guardar_config()
+    
     def _obtener_frase(self, categoria: str, subcategoria: Optional[str] = None, 
                      formato_args: Optional[List] = None) -> str:
         """Obtiene una frase según la categoría y personalidad."""
-        if categoria in self.FRASES:
-            if isinstance(self.FRASES[categoria], dict):
-                frases = self.FRASES[categoria].get(self.personalidad.value, 
-                        self.FRASES[categoria].get("amigable", ["Mensaje no disponible"]))
-            else:
-                frases = self.FRASES[categoria]
+        frases = self._frases_activas.get(categoria, _SIN_FRASES)
+        frase = _random_choice(frases) if len(frases) > 1 else frases[0]
+        
+        # Formatear la frase si hay argumentos, reutilizando el resultado de la misma plantilla
+        if formato_args:
+            clave = (frase, tuple(formato_args))
+            formateada = self._cache_formato.get(clave)
+            if formateada is not None:
+                self._cache_formato.move_to_end(clave)
+                return formateada
             
-            if frases:
-                frase = random.choice(frases) if len(frases) > 1 else frases[0]
-                
-                # Formatear la frase si hay argumentos
-                if formato_args:
-                    try:
-                        frase = frase.format(*formato_args)
-                    except:
-                        pass
-                
-                return frase
-        
-        return "Mensaje no disponible"
+            formateada = self._formatear_frase(frase, formato_args)
+            self._cache_formato[clave] = formateada
+            if len(self._cache_formato) > self.MAX_CACHE_FORMATO:
+                self._cache_formato.popitem(last=False)
+            return formateada
+        
+        return frase
+    
+    @staticmethod
+    def _formatear_frase(frase: str, formato_args: List) -> str:
+        """Rellena los huecos de la frase; si no encajan, devuelve la plantilla tal cual."""
+        try:
+            return frase.format(*formato_args)
+        except (IndexError, KeyError, ValueError):
+            return frase
     
     def _deberia_hablar(self, prioridad: int = 2) -> bool:
         """Determina si el asistente debería hablar según la verbosidad."""
-        return self.activo and prioridad >= (4 - self.nivel_verbosidad.value)
+        return self.activo and prioridad >= self._prioridad_minima
     
     def hablar(self, mensaje: str, prioridad: int = 2, categoria: Optional[str] = None, 
               emocion: Optional[Emocion] = None) -> None:
         """Hace que el asistente hable si corresponde según la configuración."""
-        if not self._deberia_hablar(prioridad):
+        # Misma comprobación que _deberia_hablar, sin la llamada extra en cada frase
+        if not (self.activo and prioridad >= self._prioridad_minima):
             return
         
         try:
@@ -282,58 +415,73 @@ class AsistenteVirtual:
             else:
                 # Hablar normalmente
                 self.voice_engine.hablar(mensaje, prioridad=(prioridad >= 3))
-            
-            # Registrar en historial
-            self.historial_frases.append({
-                "mensaje": mensaje,
-                "categoria": categoria,
-                "timestamp": time.time()
-            })
-            
-            # Mantener historial limitado
-            if len(self.historial_frases) > 100:
-                self.historial_frases.pop(0)
-                
         except Exception as e:
-            logger.error(f"Error al hacer hablar al asistente: {e}")
+            # Un fallo del audio no debe detener el bucle de frames
+            logger.error(f"Error al hacer hablar al asistente: {e}", exc_info=True)
+            return
+        
+        # Registrar en historial; las categorías se repiten, así que se internan
+        self.historial_frases.append({
+            "mensaje": mensaje,
+            "categoria": sys.intern(categoria) if categoria else categoria,
+            "timestamp": _time_time()
+        })
     
     def _reproducir_efecto_categoria(self, categoria: str):
         """Reproduce el efecto de sonido asociado a una categoría."""
-        efectos_categoria = {
-            "saludo": TipoEfecto.BIENVENIDA,
-            "despedida": TipoEfecto.DESPEDIDA,
-            "modo": TipoEfecto.CAMBIO_MODO,
-            "navegacion": TipoEfecto.HOVER,
-            "accion": TipoEfecto.CLICK,
-            "trazo_inicio": TipoEfecto.TRAZO_INICIO,
-            "trazo_fin": TipoEfecto.TRAZO_FIN,
-            "guardado": TipoEfecto.GUARDADO,
-            "error": TipoEfecto.ERROR,
-            "exito": TipoEfecto.EXITO
-        }
-        
-        if categoria in efectos_categoria:
-            self.gestor_efectos.reproducir_efecto(efectos_categoria[categoria])
+        efecto = self.EFECTOS_CATEGORIA.get(categoria)
+        if efecto is not None:
+            self.gestor_efectos.reproducir_efecto(efecto)
+    
+    def _programar(self, retardo: float, funcion, *args, **kwargs) -> None:
+        """Ejecuta una función tras un retardo en otro hilo, sin bloquear el bucle de frames."""
+        temporizador = threading.Timer(retardo, funcion, args=args, kwargs=kwargs)
+        temporizador.daemon = True
+        with self._lock_temporizadores:
+            self._temporizadores = [t for t in self._temporizadores if t.is_alive()]
+            self._temporizadores.append(temporizador)
+        temporizador.start()
+    
+    def cancelar_anuncios_programados(self) -> None:
+        """Cancela los mensajes y efectos programados que aún no se han ejecutado."""
+        with self._lock_temporizadores:
+            for temporizador in self._temporizadores:
+                temporizador.cancel()
+            self._temporizadores = []
+    
+    def esperar_anuncios_programados(self) -> None:
+        """Espera a que terminen los mensajes y efectos programados, incluidos los que programen ellos."""
+        while True:
+            with self._lock_temporizadores:
+                pendientes = [t for t in self._temporizadores if t.is_alive()]
+            if not pendientes:
+                return
+            for temporizador in pendientes:
+                temporizador.join()
     
     def saludar(self) -> None:
         """Saludo inicial del asistente."""
         frase = self._obtener_frase("saludo_inicial")
+        retardo = 0.0
         
         # Reproducir melodía de bienvenida primero
         if self.usar_efectos_sonido:
             self.gestor_efectos.reproducir_efecto(TipoEfecto.BIENVENIDA)
-            time.sleep(1)  # Esperar a que termine la melodía
+            retardo = 1.0  # Hablar cuando termine la melodía
         
-        self.hablar(frase, prioridad=3, categoria="saludo", emocion=Emocion.ALEGRE)
+        self._programar(retardo, self.hablar, frase, prioridad=3, categoria="saludo", 
+                        emocion=Emocion.ALEGRE)
         
         # En modo tutorial, agregar instrucción inicial
         if self.modo_tutorial:
-            time.sleep(2)
-            self.hablar("Empecemos seleccionando el botón 'Dibujar' con un puño cerrado.", 
-                       prioridad=3, categoria="tutorial", emocion=Emocion.ALENTADOR)
+            self._programar(retardo + 2.0, self.hablar, 
+                            "Empecemos seleccionando el botón 'Dibujar' con un puño cerrado.", 
+                            prioridad=3, categoria="tutorial", emocion=Emocion.ALENTADOR)
     
     def despedir(self) -> None:
         """Despedida del asistente con estadísticas de la sesión."""
+        self.guardar_config_pendiente()
+        
         # Calcular estadísticas finales
         tiempo_sesion = int((time.time() - self.estadisticas["tiempo_inicio"]) / 60)
         trazos = self.estadisticas["trazos_completados"]
@@ -344,9 +492,12 @@ class AsistenteVirtual:
         
         # Compartir estadísticas
         self.hablar(mensaje_stats, prioridad=3, categoria="estadisticas", emocion=Emocion.ORGULLOSO)
-        time.sleep(2)
         
-        # Despedida final
+        # Despedida final, con el fade out de la música, cuando acaben las estadísticas
+        self._programar(2.0, self._despedida_final)
+    
+    def _despedida_final(self) -> None:
+        """Segunda parte de la despedida: frase final y efecto de cierre."""
         frase = self._obtener_frase("despedida")
         
         # Fade out de música si está activa
@@ -357,11 +508,20 @@ class AsistenteVirtual:
         
         # Efecto de despedida
         if self.usar_efectos_sonido:
-            time.sleep(1)
-            self.gestor_efectos.reproducir_efecto(TipoEfecto.DESPEDIDA)
+            self._programar(1.0, self.gestor_efectos.reproducir_efecto, TipoEfecto.DESPEDIDA)
     
     def anunciar_modo(self, modo: str) -> None:
         """Anuncia el cambio de modo con efectos."""
+        self.ultima_accion = f"modo_{modo}"
+        self._ultimo_boton_hover = None
+        
+        # Actualizar estadísticas
+        self.estadisticas["modos_usados"].add(modo)
+        
+        # Comprobar la verbosidad antes de elegir la frase
+        if not self._deberia_hablar(2):
+            return
+        
         if modo == "dibujar":
             frase = self._obtener_frase("modo_dibujo")
             emocion = Emocion.EMOCIONADO
@@ -373,22 +533,23 @@ class AsistenteVirtual:
             emocion = Emocion.NEUTRAL
         
         self.hablar(frase, prioridad=2, categoria="modo", emocion=emocion)
-        self.ultima_accion = f"modo_{modo}"
-        
-        # Actualizar estadísticas
-        self.estadisticas["modos_usados"].add(modo)
     
     def anunciar_trazo(self, evento: str) -> None:
         """Anuncia eventos relacionados con trazos."""
+        if evento == "fin":
+            self.estadisticas["trazos_completados"] += 1
+        
+        # Todos los avisos de trazo son de prioridad 1
+        if not self._deberia_hablar(1):
+            return
+        
         if evento == "inicio":
             frase = self._obtener_frase("trazo_iniciado")
             self.hablar(frase, prioridad=1, categoria="trazo_inicio", emocion=Emocion.ALEGRE)
         elif evento == "fin":
-            self.estadisticas["trazos_completados"] += 1
-            
             # Dar comentarios ocasionales sobre el dibujo
             if self.estadisticas["trazos_completados"] % 5 == 0:  # Cada 5 trazos
-                comentario = random.choice(self._obtener_frase("comentarios_dibujo"))
+                comentario = self._obtener_frase("comentarios_dibujo")
                 self.hablar(comentario, prioridad=1, categoria="comentario", emocion=Emocion.ORGULLOSO)
             
             frase = self._obtener_frase("trazo_completado")
@@ -396,13 +557,19 @@ class AsistenteVirtual:
     
     def anunciar_boton_hover(self, nombre_boton: str) -> None:
         """Anuncia cuando el cursor está sobre un botón."""
-        if self.ultima_accion != f"hover_{nombre_boton}":
-            frase = self._obtener_frase("boton_hover", formato_args=[nombre_boton])
-            self.hablar(frase, prioridad=1, categoria="navegacion")
-            self.ultima_accion = f"hover_{nombre_boton}"
+        # Se llama en cada frame: comparar el nombre sin construir cadenas nuevas
+        if nombre_boton == self._ultimo_boton_hover or not self._deberia_hablar(1):
+            return
+        
+        frase = self._obtener_frase("boton_hover", formato_args=[nombre_boton])
+        self.hablar(frase, prioridad=1, categoria="navegacion")
+        self._ultimo_boton_hover = nombre_boton
+        self.ultima_accion = f"hover_{nombre_boton}"
     
     def anunciar_guardado(self) -> None:
         """Anuncia el proceso de guardado."""
+        if not self._deberia_hablar(2):
+            return
         frase = self._obtener_frase("guardando")
         self.hablar(frase, prioridad=2, categoria="sistema")
     
@@ -411,7 +578,11 @@ class AsistenteVirtual:
         if texto:
             # Actualizar estadísticas
             self.estadisticas["palabras_reconocidas"].append(texto)
-            
+        
+        if not self._deberia_hablar(3):
+            return
+        
+        if texto:
             frase = self._obtener_frase("texto_reconocido", formato_args=[texto])
             emocion = Emocion.EMOCIONADO
         else:
@@ -424,12 +595,15 @@ class AsistenteVirtual:
         """Da un consejo aleatorio al usuario."""
         self.contador_consejos += 1
         
-        if self.contador_consejos % 5 == 0:  # Cada 5 consejos
-            consejo = random.choice(self._obtener_frase("consejo_aleatorio"))
+        if self.contador_consejos % 5 == 0 and self._deberia_hablar(1):  # Cada 5 consejos
+            # _obtener_frase ya elige al azar una frase completa de la categoría
+            consejo = self._obtener_frase("consejo_aleatorio")
             self.hablar(consejo, prioridad=1, categoria="consejo")
     
     def anunciar_error(self, tipo_error: Optional[str] = None) -> None:
         """Anuncia un error al usuario."""
+        if not self._deberia_hablar(3):
+            return
         frase = self._obtener_frase("error_general")
         self.hablar(frase, prioridad=3, categoria="error")
     
@@ -437,8 +611,9 @@ class AsistenteVirtual:
         """Cambia la personalidad del asistente."""
         try:
             self.personalidad = PersonalidadAsistente(nueva_personalidad)
+            self._reconstruir_indice_frases()
             self.config["personalidad"] = nueva_personalidad
-            self._guardar_config()
+            self._marcar_config_pendiente()
             self.hablar(f"Personalidad cambiada a {nueva_personalidad}", 
                        prioridad=2, categoria="configuracion")
             return True
@@ -449,18 +624,11 @@ class AsistenteVirtual:
         """Cambia el nivel de verbosidad del asistente."""
         try:
             self.nivel_verbosidad = NivelVerbosidad(nivel)
+            self._prioridad_minima = 4 - self.nivel_verbosidad.value
             self.config["nivel_verbosidad"] = nivel
-            self._guardar_config()
-            
-            nombres_niveles = {
-                0: "silencioso",
-                1: "mínimo",
-                2: "normal",
-                3: "detallado",
-                4: "máximo"
-            }
+            self._marcar_config_pendiente()
             
-            self.hablar(f"Nivel de verbosidad cambiado a {nombres_niveles.get(nivel, 'desconocido')}", 
+            self.hablar(f"Nivel de verbosidad cambiado a {self.NOMBRES_VERBOSIDAD[self.nivel_verbosidad.value]}", 
                        prioridad=2, categoria="configuracion")
             return True
         except ValueError:
@@ -470,7 +638,7 @@ class AsistenteVirtual:
         """Activa o desactiva el modo tutorial."""
         self.modo_tutorial = activar
         self.config["modo_tutorial"] = activar
-        self._guardar_config()
+        self._marcar_config_pendiente()
         
         if activar:
             self.hablar("Modo tutorial activado. Te guiaré paso a paso.", 
@@ -483,7 +651,10 @@ class AsistenteVirtual:
         """Activa o desactiva el asistente completamente."""
         self.activo = activar
         self.config["activo"] = activar
-        self._guardar_config()
+        self._marcar_config_pendiente()
+        
+        if not activar:
+            self.cancelar_anuncios_programados()
         
         if activar:
             self.hablar("Asistente de voz activado.", prioridad=3, categoria="sistema")
@@ -491,11 +662,13 @@ class AsistenteVirtual:
     
     def dar_estadisticas_periodicas(self) -> None:
         """Da estadísticas periódicas sobre la sesión."""
-        tiempo_actual = time.time()
+        tiempo_actual = _time_time()
         tiempo_sesion = int((tiempo_actual - self.estadisticas["tiempo_inicio"]) / 60)
         
-        # Cada 5 minutos
-        if tiempo_sesion > 0 and tiempo_sesion % 5 == 0:
+        # Cada 5 minutos, una sola vez por minuto aunque se llame en cada frame
+        if (tiempo_sesion > 0 and tiempo_sesion % 5 == 0 
+                and tiempo_sesion != self._ultimo_minuto_estadisticas):
+            self._ultimo_minuto_estadisticas = tiempo_sesion
             trazos = self.estadisticas["trazos_completados"]
             frase = self._obtener_frase("estadisticas", 
                                        formato_args=[trazos, tiempo_sesion])
@@ -519,7 +692,7 @@ class AsistenteVirtual:
         if usar_voz_emotiva is not None:
             self.usar_voz_emotiva = usar_voz_emotiva
         
-        self._guardar_config()
+        self._marcar_config_pendiente()
         self.hablar("Configuración de sonido actualizada", prioridad=2, 
                    categoria="configuracion")
     
@@ -533,4 +706,4 @@ class AsistenteVirtual:
         if volumen_musica is not None:
             self.gestor_efectos.ajustar_volumen_musica(volumen_musica)
         
-        self._guardar_config()
\ No newline at end of file
+        self._marcar_config_pendiente()
\ No newline at end of file
@@ -2,16 +2,141 @@
 Módulo para gestionar la calibración de gestos y sensibilidad.
 """
 
+import importlib.util
 import logging
-import cv2
+import math
 import numpy as np
 import json
 import os
+import threading
 import time
+from collections import deque
 from typing import Dict, Tuple, Optional, List, Any
 
 logger = logging.getLogger("SistemaKinect.CalibracionManager")
 
+# OpenCV solo hace falta para dibujar la interfaz; se importa la primera vez que se usa
+cv2 = None
+
+def _importar_cv2() -> None:
+    """Importa OpenCV bajo demanda y lo deja disponible en el módulo."""
+    global cv2
+    if cv2 is None:
+        import cv2 as modulo_cv2
+        cv2 = modulo_cv2
+
+# orjson (opcional) lee y escribe el archivo de calibración en C
+try:
+    import orjson
+    ORJSON_DISPONIBLE = True
+except ImportError:
+    ORJSON_DISPONIBLE = False
+
+# Numba (opcional) compila en una sola función las métricas de los cuatro gestos; importarlo
+# y compilar es lento, así que se hace al mostrar la interfaz de calibración por primera vez
+NUMBA_DISPONIBLE = importlib.util.find_spec("numba") is not None
+
+# Índices de mp.solutions.hands.HandLandmark como enteros: son fijos en el modelo
+# de mano de MediaPipe, así que no hace falta importar mediapipe en cada cálculo
+WRIST = 0
+THUMB_TIP = 4
+INDEX_FINGER_MCP = 5
+INDEX_FINGER_PIP = 6
+INDEX_FINGER_DIP = 7
+INDEX_FINGER_TIP = 8
+MIDDLE_FINGER_MCP = 9
+MIDDLE_FINGER_TIP = 12
+RING_FINGER_TIP = 16
+PINKY_TIP = 20
+
+# A partir de estas muestras el promedio de un paso apenas cambia y se deja de registrar;
+# también es el tamaño máximo de la cola de muestras de cada gesto
+MUESTRAS_SUFICIENTES = 60
+
+# Segundos al inicio de cada paso en los que no se registran muestras, mientras se estabiliza el gesto
+TIEMPO_ESTABILIZACION = 1.0
+
+# Paso de calibración (y métrica) que corresponde a cada gesto verificable
+PASO_POR_GESTO = {
+    "mano_abierta": 0,
+    "puno_cerrado": 1,
+    "indice_extendido": 2,
+    "pinza": 3
+}
+GESTO_POR_PASO = tuple(sorted(PASO_POR_GESTO, key=PASO_POR_GESTO.get))
+
+# Máscaras de dedos levantados (bit i = dedo i, del pulgar al meñique) aceptadas en cada paso
+MASCARAS_VALIDAS_POR_PASO = (
+    frozenset(m for m in range(32) if bin(m).count("1") >= 4),  # Mano abierta: al menos 4 dedos
+    frozenset(m for m in range(32) if bin(m).count("1") <= 1),  # Puño cerrado: máximo 1 dedo
+    frozenset(m for m in range(32) if m & 0b11110 == 0b00010),  # Índice extendido: pulgar libre
+    frozenset(range(32))                                        # Pinza: cualquier combinación
+)
+
+# Grupos de índices para indexar el array de landmarks sin construir listas en cada frame
+PUNTAS_DEDOS = np.array([THUMB_TIP, INDEX_FINGER_TIP, MIDDLE_FINGER_TIP, RING_FINGER_TIP, PINKY_TIP], dtype=np.intp)
+CADENA_INDICE = np.array([INDEX_FINGER_TIP, INDEX_FINGER_DIP, INDEX_FINGER_PIP, INDEX_FINGER_MCP], dtype=np.intp)
+
+def _metrica_gesto(puntos, paso):
+    """Calcula la métrica del gesto de un paso de calibración con bucles escalares, sin arrays temporales."""
+    if paso == 0:  # Apertura: distancia media (x, y) entre puntas de dedos adyacentes
+        total = 0.0
+        for i in range(4):
+            dx = puntos[PUNTAS_DEDOS[i], 0] - puntos[PUNTAS_DEDOS[i + 1], 0]
+            dy = puntos[PUNTAS_DEDOS[i], 1] - puntos[PUNTAS_DEDOS[i + 1], 1]
+            total += math.sqrt(dx * dx + dy * dy)
+        return total / 4
+    
+    if paso == 1:  # Cierre: distancia media (x, y) desde el centro de la palma a las puntas
+        centro_x = (puntos[WRIST, 0] + puntos[MIDDLE_FINGER_MCP, 0]) / 2
+        centro_y = (puntos[WRIST, 1] + puntos[MIDDLE_FINGER_MCP, 1]) / 2
+        total = 0.0
+        for i in range(5):
+            dx = puntos[PUNTAS_DEDOS[i], 0] - centro_x
+            dy = puntos[PUNTAS_DEDOS[i], 1] - centro_y
+            total += math.sqrt(dx * dx + dy * dy)
+        return total / 5
+    
+    if paso == 2:  # Extensión: distancia directa punta-base entre longitud del índice (x, y, z)
+        longitud = 0.0
+        for i in range(3):
+            suma = 0.0
+            for eje in range(3):
+                d = puntos[CADENA_INDICE[i], eje] - puntos[CADENA_INDICE[i + 1], eje]
+                suma += d * d
+            longitud += math.sqrt(suma)
+        suma = 0.0
+        for eje in range(3):
+            d = puntos[INDEX_FINGER_TIP, eje] - puntos[INDEX_FINGER_MCP, eje]
+            suma += d * d
+        return math.sqrt(suma) / longitud if longitud > 0 else 0.0
+    
+    # Pinza: distancia (x, y, z) entre las puntas de pulgar e índice
+    suma = 0.0
+    for eje in range(3):
+        d = puntos[THUMB_TIP, eje] - puntos[INDEX_FINGER_TIP, eje]
+        suma += d * d
+    return math.sqrt(suma)
+
+# Versión de _metrica_gesto compilada con Numba, creada por _compilar_metrica_gesto
+_metrica_gesto_compilada = None
+
+def _compilar_metrica_gesto() -> None:
+    """Importa Numba y compila el kernel de métricas para todos los pasos, una sola vez."""
+    global _metrica_gesto_compilada, NUMBA_DISPONIBLE
+    if _metrica_gesto_compilada is not None or not NUMBA_DISPONIBLE:
+        return
+    try:
+        from numba import njit
+        kernel = njit(cache=True, fastmath=True)(_metrica_gesto)
+        puntos_vacios = np.zeros((21, 3), dtype=np.float32)
+        for paso in range(len(GESTO_POR_PASO)):
+            kernel(puntos_vacios, paso)
+        _metrica_gesto_compilada = kernel
+    except Exception as e:
+        logger.warning(f"No se pudo compilar la métrica de gestos con Numba: {e}")
+        NUMBA_DISPONIBLE = False
+
 class CalibracionManager:
     """Gestiona la calibración de gestos y sensibilidad del sistema."""
     
@@ -37,6 +162,10 @@ class CalibracionManager:
             "Forme un gesto de pinza (pulgar e índice)"
         ]
         self.inicio_paso = 0
+        self._inicio_registro = 0  # instante a partir del cual se registran muestras del paso
+        
+        # Evita que dos guardados en segundo plano escriban el archivo a la vez
+        self._lock_guardado = threading.Lock()
         self.duracion_paso = 3  # segundos para mantener cada gesto
         
         # Imagen para mostrar durante calibración
@@ -51,6 +180,12 @@ class CalibracionManager:
             "pinza": 0.7
         }
         
+        # Buffer de coordenadas que se rellena en cada frame en lugar de crear un array nuevo
+        self._buffer_landmarks = np.empty((21, 3), dtype=np.float32)
+        
+        # La interfaz de calibración se dibuja al mostrarla por primera vez
+        self._interfaz_preparada = False
+        
         # Cargar calibración guardada si existe
         self._cargar_calibracion()
     
@@ -60,7 +195,8 @@ class CalibracionManager:
             self.calibrando = True
             self.paso_calibracion = 0
             self.datos_calibracion = {}
-            self.inicio_paso = time.time()
+            self.inicio_paso = time.monotonic()
+            self._inicio_registro = self.inicio_paso + TIEMPO_ESTABILIZACION
             logger.info("Iniciando proceso de calibración")
             return True
         except Exception as e:
@@ -73,7 +209,8 @@ class CalibracionManager:
             return False, "No hay calibración en curso"
         
         self.paso_calibracion += 1
-        self.inicio_paso = time.time()
+        self.inicio_paso = time.monotonic()
+        self._inicio_registro = self.inicio_paso + TIEMPO_ESTABILIZACION
         
         if self.paso_calibracion >= self.total_pasos:
             # Finalizar calibración
@@ -121,15 +258,61 @@ class CalibracionManager:
             logger.error(f"Error al finalizar calibración: {e}")
             self.calibrando = False
     
-    def _calcular_umbral(self, datos: List[float]) -> float:
+    def _calcular_umbral(self, datos: deque) -> float:
         """Calcula umbral óptimo a partir de datos recopilados."""
         if not datos:
             return 0.7  # valor por defecto
         
-        # Usar promedio con ajuste de sensibilidad
-        promedio = sum(datos) / len(datos)
+        # Usar promedio de las muestras válidas con ajuste de sensibilidad
+        muestras = self._descartar_atipicos(datos)
+        promedio = float(muestras.mean())
         return promedio * self.sensibilidad_gestos
     
+    def _descartar_atipicos(self, datos: deque, iteraciones: int = 3) -> np.ndarray:
+        """Descarta muestras atípicas (p. ej. frames mal detectados) con el criterio de Chauvenet."""
+        muestras = np.asarray(datos, dtype=np.float64)
+        
+        # Versión robusta: la primera pasada se centra en la mediana, no en la media
+        centro = float(np.median(muestras))
+        for _ in range(iteraciones):
+            n = len(muestras)
+            if n < 3:
+                break
+            sigma = math.sqrt(float(np.mean((muestras - centro) ** 2)))
+            if sigma == 0:
+                break
+            
+            # Una muestra es atípica si N * erfc(|x - centro| / (sigma * sqrt(2))) < 0.5
+            z = np.abs(muestras - centro) / (sigma * math.sqrt(2))
+            validas = np.array([n * math.erfc(valor) >= 0.5 for valor in z])
+            if validas.all():
+                break
+            muestras = muestras[validas]
+            centro = float(muestras.mean())
+        
+        return muestras
+    
+    def _dividir_instruccion(self, instruccion: str) -> List[Tuple[str, Tuple[int, int]]]:
+        """Divide una instrucción en líneas que caben en pantalla y calcula su posición."""
+        ancho_maximo = self.resolution[0] - 100
+        lineas = []
+        y = 100
+        linea = ""
+        for palabra in instruccion.split():
+            prueba = linea + " " + palabra if linea else palabra
+            (ancho, _), _ = cv2.getTextSize(prueba, cv2.FONT_HERSHEY_SIMPLEX, 0.7, 2)
+            if linea and ancho > ancho_maximo:
+                lineas.append((linea, (50, y)))
+                y += 40
+                linea = palabra
+            else:
+                linea = prueba
+        
+        if linea:
+            lineas.append((linea, (50, y)))
+        
+        return lineas
+    
     def _obtener_instruccion_actual(self) -> str:
         """Obtiene la instrucción para el paso actual de calibración."""
         if 0 <= self.paso_calibracion < len(self.instrucciones):
@@ -141,172 +324,114 @@ class CalibracionManager:
         if not self.calibrando:
             return
         
-        # Solo registrar si ha pasado el tiempo mínimo de inicio del paso
-        tiempo_actual = time.time()
-        if tiempo_actual - self.inicio_paso < 1.0:
-            return  # Esperar al menos 1 segundo para estabilizar el gesto
+        # Descartar los frames del periodo de estabilización antes de tocar los landmarks
+        if time.monotonic() < self._inicio_registro:
+            return
+        
+        paso = self.paso_calibracion
+        if not 0 <= paso < len(GESTO_POR_PASO):
+            return
+        
+        # No calcular más métricas si el paso ya tiene muestras suficientes
+        clave = GESTO_POR_PASO[paso]
+        muestras = self.datos_calibracion.get(clave)
+        if muestras is not None and len(muestras) >= MUESTRAS_SUFICIENTES:
+            return
         
-        # Registrar datos según el paso actual
         try:
-            if self.paso_calibracion == 0:  # Mano abierta
-                # Calcular apertura de la mano (distancia entre dedos)
-                if sum(dedos_levantados) >= 4:  # Al menos 4 dedos levantados
-                    if "mano_abierta" not in self.datos_calibracion:
-                        self.datos_calibracion["mano_abierta"] = []
-                    
-                    # Calcular apertura promedio entre dedos
-                    apertura = self._calcular_apertura_mano(landmarks)
-                    self.datos_calibracion["mano_abierta"].append(apertura)
-            
-            elif self.paso_calibracion == 1:  # Puño cerrado
-                if sum(dedos_levantados) <= 1:  # Máximo 1 dedo levantado (para contemplar variaciones)
-                    if "puno_cerrado" not in self.datos_calibracion:
-                        self.datos_calibracion["puno_cerrado"] = []
-                    
-                    # Calcular cierre del puño
-                    cierre = self._calcular_cierre_puno(landmarks)
-                    self.datos_calibracion["puno_cerrado"].append(cierre)
-            
-            elif self.paso_calibracion == 2:  # Índice extendido
-                if dedos_levantados[1] and not any(dedos_levantados[2:]):
-                    if "indice_extendido" not in self.datos_calibracion:
-                        self.datos_calibracion["indice_extendido"] = []
-                    
-                    # Calcular extensión del índice
-                    extension = self._calcular_extension_indice(landmarks)
-                    self.datos_calibracion["indice_extendido"].append(extension)
-            
-            elif self.paso_calibracion == 3:  # Pinza
-                if "pinza" not in self.datos_calibracion:
-                    self.datos_calibracion["pinza"] = []
-                
-                # Calcular distancia pinza
-                distancia_pinza = self._calcular_distancia_pinza(landmarks)
-                self.datos_calibracion["pinza"].append(distancia_pinza)
+            # Comprobar los dedos levantados con la máscara del paso actual
+            mascara = 0
+            for i, levantado in enumerate(dedos_levantados):
+                if levantado:
+                    mascara |= 1 << i
+            if mascara not in MASCARAS_VALIDAS_POR_PASO[paso]:
+                return
+            
+            if muestras is None:
+                muestras = self.datos_calibracion[clave] = deque(maxlen=MUESTRAS_SUFICIENTES)
+            
+            # Coordenadas de los landmarks en un único array para todos los cálculos
+            puntos = self._landmarks_a_array(landmarks)
+            muestras.append(self._calcular_metrica_gesto(puntos, paso))
         
         except Exception as e:
             logger.error(f"Error al registrar datos de gesto: {e}")
     
-    def _calcular_apertura_mano(self, landmarks) -> float:
+    def _landmarks_a_array(self, landmarks) -> np.ndarray:
+        """Copia los landmarks de MediaPipe al buffer (21, 3) reutilizado con las coordenadas x, y, z."""
+        self._buffer_landmarks[:] = [(lm.x, lm.y, lm.z) for lm in landmarks.landmark]
+        return self._buffer_landmarks
+    
+    def _calcular_metrica_gesto(self, puntos: np.ndarray, paso: int) -> float:
+        """Calcula la métrica del gesto de un paso, con el kernel de Numba si está disponible."""
+        if NUMBA_DISPONIBLE and _metrica_gesto_compilada is None:
+            _compilar_metrica_gesto()
+        if _metrica_gesto_compilada is not None:
+            return float(_metrica_gesto_compilada(puntos, paso))
+        
+        calculos = (self._calcular_apertura_mano, self._calcular_cierre_puno,
+                    self._calcular_extension_indice, self._calcular_distancia_pinza)
+        return calculos[paso](puntos)
+    
+    def _calcular_apertura_mano(self, puntos: np.ndarray) -> float:
         """Calcula la apertura de la mano basada en la distancia entre dedos."""
         try:
-            # Calcular distancia entre puntas de dedos
-            mp_hands = self._get_mp_hands()
+            # Puntos de punta de dedos (solo x, y)
+            puntas = puntos[PUNTAS_DEDOS, :2]
             
-            # Puntos de punta de dedos
-            puntas = [
-                landmarks.landmark[mp_hands.HandLandmark.THUMB_TIP],
-                landmarks.landmark[mp_hands.HandLandmark.INDEX_FINGER_TIP],
-                landmarks.landmark[mp_hands.HandLandmark.MIDDLE_FINGER_TIP],
-                landmarks.landmark[mp_hands.HandLandmark.RING_FINGER_TIP],
-                landmarks.landmark[mp_hands.HandLandmark.PINKY_TIP]
-            ]
-            
-            # Calcular distancias entre dedos adyacentes
-            distancias = []
-            for i in range(len(puntas) - 1):
-                dx = puntas[i].x - puntas[i+1].x
-                dy = puntas[i].y - puntas[i+1].y
-                distancia = (dx**2 + dy**2)**0.5
-                distancias.append(distancia)
-            
-            # Promedio de distancias
-            return sum(distancias) / len(distancias)
+            # Promedio de distancias entre dedos adyacentes
+            distancias = np.linalg.norm(np.diff(puntas, axis=0), axis=1)
+            return float(distancias.mean())
         except Exception as e:
             logger.error(f"Error al calcular apertura de mano: {e}")
             return 0.1  # valor por defecto
     
-    def _calcular_cierre_puno(self, landmarks) -> float:
+    def _calcular_cierre_puno(self, puntos: np.ndarray) -> float:
         """Calcula qué tan cerrado está el puño."""
         try:
-            mp_hands = self._get_mp_hands()
-            
-            # Obtener punto central de la palma
-            wrist = landmarks.landmark[mp_hands.HandLandmark.WRIST]
-            middle_base = landmarks.landmark[mp_hands.HandLandmark.MIDDLE_FINGER_MCP]
-            
-            # Centro aproximado de la palma
-            center_x = (wrist.x + middle_base.x) / 2
-            center_y = (wrist.y + middle_base.y) / 2
+            # Centro aproximado de la palma, entre la muñeca y la base del dedo medio
+            centro = (puntos[WRIST, :2] + puntos[MIDDLE_FINGER_MCP, :2]) / 2
             
             # Puntas de los dedos
-            finger_tips = [
-                landmarks.landmark[mp_hands.HandLandmark.THUMB_TIP],
-                landmarks.landmark[mp_hands.HandLandmark.INDEX_FINGER_TIP],
-                landmarks.landmark[mp_hands.HandLandmark.MIDDLE_FINGER_TIP],
-                landmarks.landmark[mp_hands.HandLandmark.RING_FINGER_TIP],
-                landmarks.landmark[mp_hands.HandLandmark.PINKY_TIP]
-            ]
-            
-            # Calcular distancia promedio desde el centro a las puntas
-            distances = []
-            for tip in finger_tips:
-                dx = tip.x - center_x
-                dy = tip.y - center_y
-                distance = (dx**2 + dy**2)**0.5
-                distances.append(distance)
+            puntas = puntos[PUNTAS_DEDOS, :2]
             
-            # Un puño cerrado tendrá distancias más pequeñas
-            return sum(distances) / len(distances)
+            # Un puño cerrado tendrá distancias más pequeñas desde el centro a las puntas
+            return float(np.linalg.norm(puntas - centro, axis=1).mean())
         except Exception as e:
             logger.error(f"Error al calcular cierre de puño: {e}")
             return 0.2  # valor por defecto
     
-    def _calcular_extension_indice(self, landmarks) -> float:
+    def _calcular_extension_indice(self, puntos: np.ndarray) -> float:
         """Calcula la extensión del dedo índice."""
         try:
-            mp_hands = self._get_mp_hands()
+            # Puntos clave del dedo índice, de la punta a la base
+            dedo = puntos[CADENA_INDICE]
             
-            # Puntos clave del dedo índice
-            index_tip = landmarks.landmark[mp_hands.HandLandmark.INDEX_FINGER_TIP]
-            index_dip = landmarks.landmark[mp_hands.HandLandmark.INDEX_FINGER_DIP]
-            index_pip = landmarks.landmark[mp_hands.HandLandmark.INDEX_FINGER_PIP]
-            index_mcp = landmarks.landmark[mp_hands.HandLandmark.INDEX_FINGER_MCP]
-            
-            # Calcular longitud total del dedo
-            d1 = self._distancia_entre_puntos(index_tip, index_dip)
-            d2 = self._distancia_entre_puntos(index_dip, index_pip)
-            d3 = self._distancia_entre_puntos(index_pip, index_mcp)
-            
-            # Distancia directa entre punta y base
-            d_directa = self._distancia_entre_puntos(index_tip, index_mcp)
+            # Longitud total del dedo y distancia directa entre punta y base
+            longitud = float(np.linalg.norm(np.diff(dedo, axis=0), axis=1).sum())
+            d_directa = float(np.linalg.norm(dedo[0] - dedo[3]))
             
             # Relación entre distancia directa y suma de segmentos
             # Un dedo extendido tendrá una relación más cercana a 1
-            extension = d_directa / (d1 + d2 + d3) if (d1 + d2 + d3) > 0 else 0
+            extension = d_directa / longitud if longitud > 0 else 0
             
             return extension
         except Exception as e:
             logger.error(f"Error al calcular extensión del índice: {e}")
             return 0.8  # valor por defecto
     
-    def _calcular_distancia_pinza(self, landmarks) -> float:
+    def _calcular_distancia_pinza(self, puntos: np.ndarray) -> float:
         """Calcula la distancia entre el pulgar y el índice para el gesto de pinza."""
         try:
-            mp_hands = self._get_mp_hands()
-            
-            # Obtener puntas de pulgar e índice
-            thumb_tip = landmarks.landmark[mp_hands.HandLandmark.THUMB_TIP]
-            index_tip = landmarks.landmark[mp_hands.HandLandmark.INDEX_FINGER_TIP]
-            
-            # Calcular distancia
-            return self._distancia_entre_puntos(thumb_tip, index_tip)
+            # Distancia entre las puntas de pulgar e índice
+            return float(np.linalg.norm(puntos[THUMB_TIP] - puntos[INDEX_FINGER_TIP]))
         except Exception as e:
             logger.error(f"Error al calcular distancia de pinza: {e}")
             return 0.1  # valor por defecto
     
-    def _distancia_entre_puntos(self, p1, p2) -> float:
-        """Calcula la distancia euclidiana entre dos puntos."""
-        return ((p1.x - p2.x)**2 + (p1.y - p2.y)**2 + (p1.z - p2.z)**2)**0.5
-    
-    def _get_mp_hands(self):
-        """Obtiene la referencia a mp_hands (MediaPipe Hands)."""
-        import mediapipe as mp
-        return mp.solutions.hands
-    
     def verificar_tiempo_paso(self) -> bool:
         """Verifica si ha pasado suficiente tiempo en el paso actual para avanzar automáticamente."""
-        tiempo_actual = time.time()
+        tiempo_actual = time.monotonic()
         return tiempo_actual - self.inicio_paso >= self.duracion_paso
     
     def obtener_progreso_paso(self) -> float:
@@ -314,94 +439,137 @@ class CalibracionManager:
         if not self.calibrando:
             return 0.0
             
-        tiempo_actual = time.time()
+        tiempo_actual = time.monotonic()
         tiempo_transcurrido = tiempo_actual - self.inicio_paso
         return min(1.0, tiempo_transcurrido / self.duracion_paso)
     
-    def generar_imagen_instruccion(self) -> np.ndarray:
-        """Genera una imagen con instrucciones de calibración."""
-        img = np.zeros((self.resolution[1], self.resolution[0], 3), dtype=np.uint8)
-        
-        if not self.calibrando:
-            texto = "Presione el botón 'Calibrar' para iniciar calibración"
-            cv2.putText(img, texto, (50, self.resolution[1]//2), cv2.FONT_HERSHEY_SIMPLEX, 0.8, (255, 255, 255), 2)
-            return img
-        
-        # Título
-        cv2.putText(
-            img, 
-            f"Calibración - Paso {self.paso_calibracion + 1} de {self.total_pasos}", 
-            (50, 50), 
-            cv2.FONT_HERSHEY_SIMPLEX, 
-            0.8, 
-            (0, 255, 255), 
-            2
-        )
-        
-        # Instrucción actual
-        instruccion = self._obtener_instruccion_actual()
-        y = 100
-        # Dividir instrucción si es muy larga
-        palabras = instruccion.split()
-        linea = ""
-        for palabra in palabras:
-            prueba = linea + " " + palabra if linea else palabra
-            if len(prueba) > 40:  # máximo ~40 caracteres por línea
-                cv2.putText(img, linea, (50, y), cv2.FONT_HERSHEY_SIMPLEX, 0.7, (255, 255, 255), 2)
-                y += 40
-                linea = palabra
-            else:
-                linea = prueba
-        
-        if linea:
-            cv2.putText(img, linea, (50, y), cv2.FONT_HERSHEY_SIMPLEX, 0.7, (255, 255, 255), 2)
-        
-        # Barra de progreso
-        progreso = self.obtener_progreso_paso()
+    def _geometria_barra(self) -> Tuple[int, int, int, int]:
+        """Devuelve posición y tamaño (x, y, ancho, alto) de la barra de progreso."""
         ancho_barra = int(self.resolution[0] * 0.7)
         alto_barra = 30
         x_barra = (self.resolution[0] - ancho_barra) // 2
         y_barra = self.resolution[1] - 100
+        return x_barra, y_barra, ancho_barra, alto_barra
+    
+    def _preparar_imagenes_estaticas(self) -> None:
+        """Dibuja la imagen de reposo y el fondo con la barra de progreso vacía."""
+        self._imagen_reposo = np.zeros((self.resolution[1], self.resolution[0], 3), dtype=np.uint8)
+        texto = "Presione el botón 'Calibrar' para iniciar calibración"
+        cv2.putText(self._imagen_reposo, texto, (50, self.resolution[1]//2), 
+                    cv2.FONT_HERSHEY_SIMPLEX, 0.8, (255, 255, 255), 2)
+        
+        self._fondo_calibracion = np.zeros((self.resolution[1], self.resolution[0], 3), dtype=np.uint8)
+        x_barra, y_barra, ancho_barra, alto_barra = self._geometria_barra()
         
         # Fondo de la barra
         cv2.rectangle(
-            img, 
+            self._fondo_calibracion, 
             (x_barra, y_barra), 
             (x_barra + ancho_barra, y_barra + alto_barra), 
             (100, 100, 100), 
             -1
         )
         
-        # Barra de progreso
-        ancho_progreso = int(ancho_barra * progreso)
-        cv2.rectangle(
-            img, 
-            (x_barra, y_barra), 
-            (x_barra + ancho_progreso, y_barra + alto_barra), 
-            (0, 255, 0), 
-            -1
-        )
-        
         # Borde de la barra
         cv2.rectangle(
-            img, 
+            self._fondo_calibracion, 
             (x_barra, y_barra), 
             (x_barra + ancho_barra, y_barra + alto_barra), 
             (255, 255, 255), 
             2
         )
+    
+    def _preparar_interfaz(self) -> None:
+        """Importa OpenCV y dibuja una sola vez los elementos estáticos de la interfaz."""
+        _importar_cv2()
+        
+        # Compilar el kernel de Numba ahora y no en el primer frame con la mano en cámara
+        _compilar_metrica_gesto()
+        
+        # Imagen de reposo y fondo con la barra de progreso vacía
+        self._preparar_imagenes_estaticas()
+        
+        # Líneas ya divididas de cada instrucción con su posición en pantalla
+        self._instruccion_layout = [self._dividir_instruccion(texto) for texto in self.instrucciones]
+        
+        # Ilustración de cada gesto con su máscara, para pegarla sin redibujarla
+        self._ilustraciones = self._preparar_ilustraciones()
+        
+        self._interfaz_preparada = True
+    
+    def generar_imagen_instruccion(self) -> np.ndarray:
+        """Genera una imagen con instrucciones de calibración."""
+        if not self._interfaz_preparada:
+            self._preparar_interfaz()
+        
+        if not self.calibrando:
+            return self._imagen_reposo.copy()
+        
+        img = self._fondo_calibracion.copy()
+        
+        # Título
+        cv2.putText(
+            img, 
+            f"Calibración - Paso {self.paso_calibracion + 1} de {self.total_pasos}", 
+            (50, 50), 
+            cv2.FONT_HERSHEY_SIMPLEX, 
+            0.8, 
+            (0, 255, 255), 
+            2
+        )
+        
+        # Instrucción actual, con las líneas calculadas en _preparar_interfaz
+        if 0 <= self.paso_calibracion < len(self._instruccion_layout):
+            lineas = self._instruccion_layout[self.paso_calibracion]
+        else:
+            lineas = self._dividir_instruccion(self._obtener_instruccion_actual())
+        for linea, posicion in lineas:
+            cv2.putText(img, linea, posicion, cv2.FONT_HERSHEY_SIMPLEX, 0.7, (255, 255, 255), 2)
         
-        # Ilustración o imagen de referencia para el gesto
-        self._dibujar_ilustracion_gesto(img)
+        # Barra de progreso, dentro del borde ya dibujado en el fondo
+        progreso = self.obtener_progreso_paso()
+        x_barra, y_barra, ancho_barra, alto_barra = self._geometria_barra()
+        ancho_progreso = int(ancho_barra * progreso)
+        if ancho_progreso > 2:
+            cv2.rectangle(
+                img, 
+                (x_barra + 2, y_barra + 2), 
+                (x_barra + ancho_progreso - 2, y_barra + alto_barra - 2), 
+                (0, 255, 0), 
+                -1
+            )
+        
+        # Ilustración del gesto, pegada desde la capa dibujada en _preparar_interfaz
+        if 0 <= self.paso_calibracion < len(self._ilustraciones) and self._ilustraciones[self.paso_calibracion]:
+            region, recorte, mascara = self._ilustraciones[self.paso_calibracion]
+            np.copyto(img[region], recorte, where=mascara)
         
         return img
     
-    def _dibujar_ilustracion_gesto(self, img: np.ndarray) -> None:
+    def _preparar_ilustraciones(self) -> List[Optional[Tuple[Tuple[slice, slice], np.ndarray, np.ndarray]]]:
+        """Dibuja una vez la ilustración de cada paso y guarda su recorte y su máscara."""
+        ilustraciones = []
+        for paso in range(self.total_pasos):
+            capa = np.zeros((self.resolution[1], self.resolution[0], 3), dtype=np.uint8)
+            self._dibujar_ilustracion_gesto(capa, paso)
+            
+            # Recortar a la zona dibujada para copiar solo esos píxeles en cada frame
+            filas, columnas = np.nonzero(capa.any(axis=2))
+            if len(filas) == 0:
+                ilustraciones.append(None)
+                continue
+            region = (slice(filas.min(), filas.max() + 1), slice(columnas.min(), columnas.max() + 1))
+            recorte = capa[region].copy()
+            ilustraciones.append((region, recorte, recorte.any(axis=2, keepdims=True)))
+        
+        return ilustraciones
+    
+    def _dibujar_ilustracion_gesto(self, img: np.ndarray, paso: int) -> None:
         """Dibuja una ilustración del gesto que se debe realizar."""
         centro_x = self.resolution[0] // 2
         centro_y = self.resolution[1] // 2
         
-        if self.paso_calibracion == 0:  # Mano abierta
+        if paso == 0:  # Mano abierta
             # Dibujar palma
             cv2.circle(img, (centro_x, centro_y), 50, (100, 100, 255), -1)
             
@@ -413,12 +581,12 @@ class CalibracionManager:
                 cv2.line(img, (centro_x, centro_y), (x_fin, y_fin), (100, 100, 255), 15)
                 cv2.circle(img, (x_fin, y_fin), 10, (255, 200, 200), -1)
         
-        elif self.paso_calibracion == 1:  # Puño cerrado
+        elif paso == 1:  # Puño cerrado
             # Dibujar puño
             cv2.circle(img, (centro_x, centro_y), 60, (100, 100, 200), -1)
             cv2.circle(img, (centro_x, centro_y), 40, (150, 150, 220), -1)
         
-        elif self.paso_calibracion == 2:  # Índice extendido
+        elif paso == 2:  # Índice extendido
             # Dibujar palma
             cv2.circle(img, (centro_x, centro_y), 50, (100, 100, 255), -1)
             
@@ -428,7 +596,7 @@ class CalibracionManager:
             cv2.line(img, (centro_x, centro_y), (x_fin, y_fin), (100, 100, 255), 15)
             cv2.circle(img, (x_fin, y_fin), 10, (255, 200, 200), -1)
         
-        elif self.paso_calibracion == 3:  # Pinza
+        elif paso == 3:  # Pinza
             # Dibujar palma
             cv2.circle(img, (centro_x, centro_y), 50, (100, 100, 255), -1)
             
@@ -446,7 +614,7 @@ class CalibracionManager:
                       15, (255, 200, 200), -1)
     
     def _guardar_calibracion(self) -> bool:
-        """Guarda la calibración actual en un archivo."""
+        """Serializa la calibración actual y la escribe en un archivo en segundo plano."""
         try:
             datos = {
                 "sensibilidad_gestos": self.sensibilidad_gestos,
@@ -456,29 +624,45 @@ class CalibracionManager:
                 "fecha_calibracion": time.strftime("%Y-%m-%d %H:%M:%S")
             }
             
-            with open("calibracion.json", "w") as archivo:
-                json.dump(datos, archivo, indent=4)
+            if ORJSON_DISPONIBLE:
+                contenido = orjson.dumps(datos, option=orjson.OPT_INDENT_2)
+            else:
+                contenido = json.dumps(datos, indent=4).encode('utf-8')
             
-            logger.info("Calibración guardada en archivo")
+            threading.Thread(target=self._escribir_calibracion, args=(contenido,), daemon=True).start()
             return True
         except Exception as e:
             logger.error(f"Error al guardar calibración: {e}")
             return False
     
+    def _escribir_calibracion(self, contenido: bytes) -> None:
+        """Escribe la calibración en un archivo temporal y lo reemplaza de forma atómica."""
+        try:
+            with self._lock_guardado:
+                ruta_tmp = "calibracion.json.tmp"
+                with open(ruta_tmp, "wb", buffering=1 << 16) as archivo:
+                    archivo.write(contenido)
+                os.replace(ruta_tmp, "calibracion.json")
+            
+            logger.info("Calibración guardada en archivo")
+        except Exception as e:
+            logger.error(f"Error al guardar calibración: {e}")
+    
     def _cargar_calibracion(self) -> bool:
         """Carga la calibración desde un archivo si existe."""
         try:
-            if os.path.exists("calibracion.json"):
-                with open("calibracion.json", "r") as archivo:
-                    datos = json.load(archivo)
-                
-                self.sensibilidad_gestos = datos.get("sensibilidad_gestos", self.sensibilidad_gestos)
-                self.distancia_minima_dedos = datos.get("distancia_minima_dedos", self.distancia_minima_dedos)
-                self.tiempo_gesto = datos.get("tiempo_gesto", self.tiempo_gesto)
-                self.umbrales_gestos = datos.get("umbrales_gestos", self.umbrales_gestos)
-                
-                logger.info("Calibración cargada desde archivo")
-                return True
+            with open("calibracion.json", "rb") as archivo:
+                contenido = archivo.read()
+            datos = orjson.loads(contenido) if ORJSON_DISPONIBLE else json.loads(contenido)
+            
+            self.sensibilidad_gestos = datos.get("sensibilidad_gestos", self.sensibilidad_gestos)
+            self.distancia_minima_dedos = datos.get("distancia_minima_dedos", self.distancia_minima_dedos)
+            self.tiempo_gesto = datos.get("tiempo_gesto", self.tiempo_gesto)
+            self.umbrales_gestos = datos.get("umbrales_gestos", self.umbrales_gestos)
+            
+            logger.info("Calibración cargada desde archivo")
+            return True
+        except FileNotFoundError:
             return False
         except Exception as e:
             logger.error(f"Error al cargar calibración: {e}")
@@ -497,28 +681,14 @@ class CalibracionManager:
     
     def verificar_gesto(self, landmarks, dedos_levantados: List[bool], tipo_gesto: str) -> float:
         """Verifica qué tan cerca está un gesto del umbral de reconocimiento."""
-        try:
-            if tipo_gesto == "mano_abierta":
-                apertura = self._calcular_apertura_mano(landmarks)
-                umbral = self.umbrales_gestos.get("mano_abierta", 0.7)
-                return apertura / umbral if umbral > 0 else 0
-            
-            elif tipo_gesto == "puno_cerrado":
-                cierre = self._calcular_cierre_puno(landmarks)
-                umbral = self.umbrales_gestos.get("puno_cerrado", 0.7)
-                return cierre / umbral if umbral > 0 else 0
-            
-            elif tipo_gesto == "indice_extendido":
-                extension = self._calcular_extension_indice(landmarks)
-                umbral = self.umbrales_gestos.get("indice_extendido", 0.7)
-                return extension / umbral if umbral > 0 else 0
-            
-            elif tipo_gesto == "pinza":
-                distancia = self._calcular_distancia_pinza(landmarks)
-                umbral = self.umbrales_gestos.get("pinza", 0.7)
-                return distancia / umbral if umbral > 0 else 0
-            
+        paso = PASO_POR_GESTO.get(tipo_gesto)
+        if paso is None:
             return 0.0
+        
+        try:
+            valor = self._calcular_metrica_gesto(self._landmarks_a_array(landmarks), paso)
+            umbral = self.umbrales_gestos.get(tipo_gesto, 0.7)
+            return valor / umbral if umbral > 0 else 0
         except Exception as e:
             logger.error(f"Error al verificar gesto: {e}")
             return 0.0
\ No newline at end of file
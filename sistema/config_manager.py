@@ -9,6 +9,21 @@ from typing import Dict, Optional, Union
 
 logger = logging.getLogger("SistemaKinect.ConfigManager")
 
+# orjson (opcional) lee y escribe la configuración en C
+try:
+    import orjson
+    ORJSON_DISPONIBLE = True
+except ImportError:
+    ORJSON_DISPONIBLE = False
+
+def _leer_json(ruta: str) -> Dict:
+    """Lee un archivo JSON con orjson si está disponible o con json en su defecto."""
+    with open(ruta, 'rb') as f:
+        contenido = f.read()
+    if ORJSON_DISPONIBLE:
+        return orjson.loads(contenido)
+    return json.loads(contenido)
+
 class ConfigManager:
     """Gestiona la configuración del sistema."""
     
@@ -55,17 +70,19 @@ class ConfigManager:
     def cargar_config(self) -> Dict:
         """Carga la configuración desde archivo o usa valores predeterminados."""
         try:
-            if self.config_path and os.path.exists(self.config_path):
-                with open(self.config_path, 'r', encoding='utf-8') as f:
-                    config = json.load(f)
-                logger.info(f"Configuración cargada desde {self.config_path}.")
-                return config
-            elif os.path.exists(self.CONFIG_FILE):
-                with open(self.CONFIG_FILE, 'r', encoding='utf-8') as f:
-                    config = json.load(f)
+            if self.config_path:
+                try:
+                    config = _leer_json(self.config_path)
+                    logger.info(f"Configuración cargada desde {self.config_path}.")
+                    return config
+                except FileNotFoundError:
+                    pass
+            
+            try:
+                config = _leer_json(self.CONFIG_FILE)
                 logger.info("Configuración cargada desde archivo predeterminado.")
                 return config
-            else:
+            except FileNotFoundError:
                 logger.info("Archivo de configuración no encontrado. Usando valores predeterminados.")
                 return self.DEFAULT_CONFIG
         except Exception as e:
@@ -75,8 +92,13 @@ class ConfigManager:
     def guardar_config(self) -> bool:
         """Guarda la configuración actual en archivo."""
         try:
-            with open(self.CONFIG_FILE, 'w', encoding='utf-8') as f:
-                json.dump(self.config, f, indent=4)
+            if ORJSON_DISPONIBLE:
+                contenido = orjson.dumps(self.config, option=orjson.OPT_INDENT_2)
+            else:
+                contenido = json.dumps(self.config, indent=4).encode('utf-8')
+            
+            with open(self.CONFIG_FILE, 'wb') as f:
+                f.write(contenido)
             logger.info("Configuración guardada correctamente.")
             return True
         except Exception as e:
@@ -2,6 +2,8 @@
 Módulo para gestionar las funcionalidades de dibujo.
 """
 
+import bisect
+import heapq
 import logging
 import cv2
 import numpy as np
@@ -9,11 +11,50 @@ import os
 import time
 import json
 import pickle
+from collections import OrderedDict
 from datetime import datetime
+from operator import itemgetter
 from typing import List, Tuple, Optional, Dict
 
 logger = logging.getLogger("SistemaKinect.DibujoManager")
 
+# Numba (opcional) pinta en una sola llamada todos los círculos de un trazo de borrado
+try:
+    from numba import njit, prange
+    NUMBA_DISPONIBLE = True
+except ImportError:
+    NUMBA_DISPONIBLE = False
+    prange = range
+
+# Cada cuántos trazos se guarda una copia del lienzo para no repetir todo el historial al deshacer
+INTERVALO_INSTANTANEAS = 20
+
+# Máximo de trazos que se pueden deshacer
+MAX_HISTORIAL = 200
+
+# Lienzos reconstruidos que se conservan para alternar deshacer/rehacer sin repetir trazos
+MAX_CACHE_RECONSTRUCCION = 4
+
+def _borrar_circulos(lienzo, xs, ys, radio, b, g, r):
+    """Rellena con el color (b, g, r) un círculo de radio dado en cada centro (xs[i], ys[i])."""
+    alto = lienzo.shape[0]
+    ancho = lienzo.shape[1]
+    radio2 = radio * radio
+    for i in prange(xs.shape[0]):
+        cx = xs[i]
+        cy = ys[i]
+        for y in range(max(cy - radio, 0), min(cy + radio + 1, alto)):
+            dy = y - cy
+            for x in range(max(cx - radio, 0), min(cx + radio + 1, ancho)):
+                dx = x - cx
+                if dx * dx + dy * dy <= radio2:
+                    lienzo[y, x, 0] = b
+                    lienzo[y, x, 1] = g
+                    lienzo[y, x, 2] = r
+
+if NUMBA_DISPONIBLE:
+    _borrar_circulos = njit(parallel=True, cache=True)(_borrar_circulos)
+
 class DibujoManager:
     """Gestiona las funcionalidades de dibujo avanzadas."""
     
@@ -25,19 +66,31 @@ class DibujoManager:
         
         self.resolution = tuple(self.config.get("kinect", {}).get("resolution", [640, 480]))
         self.dibujo = np.zeros((self.resolution[1], self.resolution[0], 3), dtype=np.uint8)
-        self.capa_temporal = np.zeros_like(self.dibujo)  # Capa para efectos temporales
+        self._capa_temporal = []  # Efectos temporales (indicador, paleta) que se pintan sobre la salida
+        self._paleta_layout = None  # (parámetros, cuadros) de la última paleta dibujada
         
         self.modo_dibujo = False
         self.puntos_dibujo = []
         self.historial_trazos = []  # Para deshacer/rehacer
         self.historial_index = -1
+        self._instantaneas = []  # (índice del último trazo aplicado, copia del lienzo), ordenadas por índice
+        self._cache_reconstruccion = OrderedDict()  # historial_index -> lienzo reconstruido
         self.grosor_linea = self.dibujo_config.get("grosor_linea", 3)
         self.radio_borrador = self.dibujo_config.get("radio_borrador", 30)
         self.color_dibujo = tuple(self.colores.get("dibujo", [0, 255, 0]))
+        # Colores fijos del borrador y del indicador, convertidos una sola vez
+        self._color_borrador = tuple(self.colores.get("borrador", [0, 0, 0]))
+        self._color_indicador = tuple(self.colores.get("indicador", (255, 0, 255)))
         self.dibujando = False
         self.ultimo_autosave = time.time()
         self.autosave_interval = self.dibujo_config.get("autosave_interval", 60)  # en segundos
         self.sesiones_dir = self.dibujo_config.get("sesiones_dir", "sesiones")
+        self._cambios_sin_guardar = False  # el lienzo cambió desde el último guardado
+        
+        # Diario de cambios: entre autoguardados completos solo se añaden los trazos nuevos
+        self._diario = None  # archivo .diario abierto junto al último autoguardado completo
+        self._autosaves_sin_compactar = 0
+        self.autosaves_por_compactacion = self.dibujo_config.get("autosaves_por_compactacion", 5)
         
         # Asegurar que exista el directorio para sesiones
         if not os.path.exists(self.sesiones_dir):
@@ -48,35 +101,43 @@ class DibujoManager:
         
         # Estado de sesión actual
         self.sesion_actual = None
+        
+        # Función para narrar acciones (AsistenteVirtual.hablar), asignada con establecer_asistente
+        self._narrar = None
+        
+        # Compilar el kernel de borrado ahora y no en el primer deshacer
+        if NUMBA_DISPONIBLE:
+            centro = np.zeros(1, dtype=np.int32)
+            _borrar_circulos(np.zeros((1, 1, 3), dtype=np.uint8), centro, centro, 1, *self._color_borrador)
     
     def limpiar_dibujo(self) -> None:
         """Limpia el lienzo de dibujo."""
         self.dibujo = np.zeros((self.resolution[1], self.resolution[0], 3), dtype=np.uint8)
-        self.capa_temporal = np.zeros_like(self.dibujo)
+        self._capa_temporal = []
         self.historial_trazos = []
         self.historial_index = -1
+        self._instantaneas = []
+        self._cache_reconstruccion.clear()
+        self._cambios_sin_guardar = True
+        self._anotar_diario(('limpiar',))
         logger.info("Lienzo de dibujo limpiado.")
     
     def dibujar_punto(self, x: int, y: int) -> None:
         """Dibuja un punto en las coordenadas dadas."""
         if 0 <= x < self.resolution[0] and 0 <= y < self.resolution[1]:
             if not self.dibujando:
-                self.puntos_dibujo = [(x, y)]
                 self.dibujando = True
-                # Iniciar un nuevo trazo para el historial
-                self.historial_trazos = self.historial_trazos[:self.historial_index + 1]
-                self.historial_trazos.append({
+                # Iniciar un nuevo trazo para el historial; sus puntos son los del trazo en curso
+                self.puntos_dibujo = [(x, y)]
+                self._iniciar_trazo({
                     'tipo': 'trazo',
                     'color': self.color_dibujo,
                     'grosor': self.grosor_linea,
-                    'puntos': [(x, y)]
+                    'puntos': self.puntos_dibujo
                 })
-                self.historial_index = len(self.historial_trazos) - 1
             else:
+                # La lista es compartida con el trazo del historial
                 self.puntos_dibujo.append((x, y))
-                # Actualizar el trazo actual en el historial
-                if self.historial_trazos and self.historial_index >= 0:
-                    self.historial_trazos[self.historial_index]['puntos'].append((x, y))
                 
                 if len(self.puntos_dibujo) > 1:
                     cv2.line(
@@ -87,10 +148,7 @@ class DibujoManager:
                         self.grosor_linea
                     )
             
-            # Verificar si es momento de autosave
-            if time.time() - self.ultimo_autosave > self.autosave_interval:
-                self._auto_guardar_sesion()
-                self.ultimo_autosave = time.time()
+            self._cambios_sin_guardar = True
     
     def borrar_punto(self, x: int, y: int) -> None:
         """Borra en las coordenadas dadas utilizando un borrador circular."""
@@ -98,30 +156,66 @@ class DibujoManager:
             if not self.dibujando:
                 self.dibujando = True
                 # Iniciar un nuevo trazo de borrado para el historial
-                self.historial_trazos = self.historial_trazos[:self.historial_index + 1]
-                self.historial_trazos.append({
+                self._iniciar_trazo({
                     'tipo': 'borrado',
                     'radio': self.radio_borrador,
                     'puntos': [(x, y)]
                 })
-                self.historial_index = len(self.historial_trazos) - 1
             else:
                 # Actualizar el trazo de borrado en el historial
                 if self.historial_trazos and self.historial_index >= 0:
                     self.historial_trazos[self.historial_index]['puntos'].append((x, y))
             
-            cv2.circle(
-                self.dibujo, 
-                (x, y), 
-                self.radio_borrador, 
-                tuple(self.colores.get("borrador", [0, 0, 0])), 
-                -1
-            )
+            self._borrar(self.dibujo, [(x, y)], self.radio_borrador)
+            self._cambios_sin_guardar = True
+    
+    def _iniciar_trazo(self, trazo: Dict, recortar: bool = True) -> None:
+        """Añade un trazo nuevo al historial, descartando las acciones deshechas."""
+        self.historial_trazos = self.historial_trazos[:self.historial_index + 1]
+        self._cache_reconstruccion.clear()
+        while self._instantaneas and self._instantaneas[-1][0] > self.historial_index:
+            self._instantaneas.pop()
+        
+        # El lienzo actual refleja todos los trazos hasta historial_index
+        if (self.historial_index >= 0 and (self.historial_index + 1) % INTERVALO_INSTANTANEAS == 0
+                and (not self._instantaneas or self._instantaneas[-1][0] != self.historial_index)):
+            self._instantaneas.append((self.historial_index, self.dibujo.copy()))
+        
+        self.historial_trazos.append(trazo)
+        self.historial_index = len(self.historial_trazos) - 1
+        
+        # Al reproducir un diario los recortes vienen anotados en él
+        if recortar and len(self.historial_trazos) > MAX_HISTORIAL:
+            self._recortar_historial()
+    
+    def _recortar_historial(self, descartados: Optional[int] = None) -> None:
+        """Descarta los trazos más antiguos; sin descartados, hasta la instantánea que cubra el exceso."""
+        if descartados is None:
+            exceso = len(self.historial_trazos) - MAX_HISTORIAL
+            for indice, _ in self._instantaneas:
+                if exceso - 1 <= indice < self.historial_index:
+                    break
+            else:
+                return  # todavía no hay una instantánea que cubra los trazos sobrantes
+            descartados = indice + 1
+            self._anotar_diario(('recorte', descartados))
+        
+        # El lienzo tras el último trazo descartado pasa a ser el anterior al primero (índice -1)
+        base = self._lienzo_en_indice(descartados - 1)
+        self.historial_trazos = self.historial_trazos[descartados:]
+        self.historial_index -= descartados
+        self._instantaneas = [(-1, base)] + [
+            (i - descartados, copia) for i, copia in self._instantaneas if i >= descartados
+        ]
+        self._cache_reconstruccion.clear()
     
     def terminar_dibujo(self) -> None:
         """Termina el trazo actual de dibujo."""
+        if self.dibujando and 0 <= self.historial_index < len(self.historial_trazos):
+            self._anotar_diario(('trazo', self.historial_trazos[self.historial_index]))
         self.dibujando = False
-        self.puntos_dibujo.clear()
+        # Soltar la referencia sin vaciar la lista, que pertenece al historial
+        self.puntos_dibujo = []
     
     def cambiar_color(self, color: Tuple[int, int, int]) -> None:
         """Cambia el color de dibujo."""
@@ -135,18 +229,17 @@ class DibujoManager:
             logger.info(f"Color de dibujo cambiado a {nombre_color}: {self.color_dibujo}")
             
             # Narrar el cambio de color si el asistente está disponible
-            try:
-                from . import sistema_interactivo
-                if hasattr(sistema_interactivo, 'asistente'):
-                    sistema_interactivo.asistente.hablar(f"Color cambiado a {nombre_color}", 
-                                                       prioridad=1, categoria="configuracion")
-            except:
-                pass
+            if self._narrar is not None:
+                self._narrar(f"Color cambiado a {nombre_color}", prioridad=1, categoria="configuracion")
                 
             return True
         logger.warning(f"Color {nombre_color} no encontrado en la paleta.")
         return False
     
+    def establecer_asistente(self, asistente) -> None:
+        """Asigna el asistente virtual que narra los cambios de color y el deshacer/rehacer."""
+        self._narrar = asistente.hablar if asistente is not None else None
+    
     def cambiar_grosor(self, grosor: int) -> None:
         """Cambia el grosor de línea de dibujo."""
         if grosor > 0:
@@ -164,16 +257,12 @@ class DibujoManager:
         if self.historial_index >= 0:
             self.historial_index -= 1
             self._reconstruir_dibujo()
+            self._anotar_diario(('indice', self.historial_index))
             logger.info("Acción deshecha.")
             
             # Narrar la acción si el asistente está disponible
-            try:
-                from . import sistema_interactivo
-                if hasattr(sistema_interactivo, 'asistente'):
-                    sistema_interactivo.asistente.hablar("Acción deshecha", 
-                                                       prioridad=1, categoria="edicion")
-            except:
-                pass
+            if self._narrar is not None:
+                self._narrar("Acción deshecha", prioridad=1, categoria="edicion")
                 
             return True
         logger.info("No hay más acciones para deshacer.")
@@ -184,16 +273,12 @@ class DibujoManager:
         if self.historial_index < len(self.historial_trazos) - 1:
             self.historial_index += 1
             self._reconstruir_dibujo()
+            self._anotar_diario(('indice', self.historial_index))
             logger.info("Acción rehecha.")
             
             # Narrar la acción si el asistente está disponible
-            try:
-                from . import sistema_interactivo
-                if hasattr(sistema_interactivo, 'asistente'):
-                    sistema_interactivo.asistente.hablar("Acción rehecha", 
-                                                       prioridad=1, categoria="edicion")
-            except:
-                pass
+            if self._narrar is not None:
+                self._narrar("Acción rehecha", prioridad=1, categoria="edicion")
                 
             return True
         logger.info("No hay más acciones para rehacer.")
@@ -201,30 +286,67 @@ class DibujoManager:
     
     def _reconstruir_dibujo(self) -> None:
         """Reconstruye el dibujo a partir del historial de trazos hasta el índice actual."""
-        self.dibujo = np.zeros((self.resolution[1], self.resolution[0], 3), dtype=np.uint8)
+        self._cambios_sin_guardar = True
+        self.dibujo = self._lienzo_en_indice(self.historial_index)
+    
+    def _lienzo_en_indice(self, indice_objetivo: int) -> np.ndarray:
+        """Devuelve un lienzo nuevo con los trazos del historial hasta el índice dado."""
+        # Lienzo ya reconstruido para este índice (p. ej. al alternar deshacer y rehacer)
+        lienzo = self._cache_reconstruccion.get(indice_objetivo)
+        if lienzo is not None:
+            self._cache_reconstruccion.move_to_end(indice_objetivo)
+            return lienzo.copy()
         
-        for i in range(self.historial_index + 1):
-            trazo = self.historial_trazos[i]
-            puntos = trazo['puntos']
-            
-            if trazo['tipo'] == 'trazo' and len(puntos) > 1:
-                for j in range(1, len(puntos)):
-                    cv2.line(
-                        self.dibujo,
-                        puntos[j-1],
-                        puntos[j],
-                        trazo['color'],
-                        trazo['grosor']
-                    )
-            elif trazo['tipo'] == 'borrado':
-                for punto in puntos:
-                    cv2.circle(
-                        self.dibujo,
-                        punto,
-                        trazo['radio'],
-                        tuple(self.colores.get("borrador", [0, 0, 0])),
-                        -1
-                    )
+        # Partir de la instantánea más reciente que no supere el índice pedido
+        indices = [indice for indice, _ in self._instantaneas]
+        posicion = bisect.bisect_right(indices, indice_objetivo) - 1
+        if posicion >= 0:
+            indice, lienzo = self._instantaneas[posicion]
+            lienzo = lienzo.copy()
+            inicio = indice + 1
+        else:
+            lienzo = np.zeros((self.resolution[1], self.resolution[0], 3), dtype=np.uint8)
+            inicio = 0
+        
+        for i in range(inicio, indice_objetivo + 1):
+            self._aplicar_trazo(self.historial_trazos[i], lienzo)
+        
+        self._cache_reconstruccion[indice_objetivo] = lienzo.copy()
+        if len(self._cache_reconstruccion) > MAX_CACHE_RECONSTRUCCION:
+            self._cache_reconstruccion.popitem(last=False)
+        return lienzo
+    
+    def _aplicar_trazo(self, trazo: Dict, lienzo: np.ndarray) -> None:
+        """Dibuja en el lienzo dado un trazo del historial."""
+        puntos = trazo['puntos']
+        
+        if trazo['tipo'] == 'trazo' and len(puntos) > 1:
+            # Todo el trazo en una sola llamada en lugar de un cv2.line por segmento
+            cv2.polylines(
+                lienzo,
+                [np.asarray(puntos, dtype=np.int32).reshape(-1, 1, 2)],
+                False,
+                trazo['color'],
+                trazo['grosor']
+            )
+        elif trazo['tipo'] == 'borrado':
+            self._borrar(lienzo, puntos, trazo['radio'])
+    
+    def _borrar(self, lienzo: np.ndarray, puntos: List[Tuple[int, int]], radio: int) -> None:
+        """Pinta con el color del borrador un círculo en cada punto; igual en vivo y al reconstruir."""
+        if NUMBA_DISPONIBLE and puntos:
+            centros = np.asarray(puntos, dtype=np.int32)
+            _borrar_circulos(lienzo, centros[:, 0], centros[:, 1], radio, *self._color_borrador)
+            return
+        
+        for punto in puntos:
+            cv2.circle(
+                lienzo,
+                punto,
+                radio,
+                self._color_borrador,
+                -1
+            )
     
     def guardar_dibujo(self, nombre_archivo: str = "dibujo.png") -> str:
         """Guarda el dibujo actual como imagen."""
@@ -255,7 +377,7 @@ class DibujoManager:
             
             # Crear diccionario con todos los datos de la sesión
             datos_sesion = {
-                'dibujo': self.dibujo.tolist(),  # Convertir a lista para serialización
+                'dibujo': self.dibujo,  # pickle serializa el ndarray como un único buffer
                 'historial_trazos': self.historial_trazos,
                 'historial_index': self.historial_index,
                 'color_dibujo': self.color_dibujo,
@@ -263,36 +385,122 @@ class DibujoManager:
                 'radio_borrador': self.radio_borrador,
                 'timestamp': datetime.now().isoformat()
             }
+            self._anadir_lienzo_base(datos_sesion)
             
             # Guardar datos usando pickle
             with open(ruta_sesion, 'wb') as archivo:
-                pickle.dump(datos_sesion, archivo)
+                pickle.dump(datos_sesion, archivo, protocol=pickle.HIGHEST_PROTOCOL)
+            self._escribir_metadatos(ruta_sesion, datos_sesion)
             
             self.sesion_actual = nombre_sesion
+            self._cambios_sin_guardar = False
             logger.info(f"Sesión guardada como {ruta_sesion}")
             return ruta_sesion
         except Exception as e:
             logger.error(f"Error al guardar sesión: {e}")
             return ""
     
+    def verificar_autosave(self, tiempo_actual: Optional[float] = None) -> None:
+        """Lanza el autoguardado si venció el intervalo y el lienzo tiene cambios; se llama una vez por frame."""
+        # Esperar al final del trazo: la sesión guardaría el trazo a medias y el diario, después, el completo
+        if self.dibujando:
+            return
+        if tiempo_actual is None:
+            tiempo_actual = time.time()
+        if tiempo_actual - self.ultimo_autosave > self.autosave_interval:
+            self._auto_guardar_sesion()
+            self.ultimo_autosave = tiempo_actual
+    
     def _auto_guardar_sesion(self) -> None:
         """Guarda automáticamente la sesión actual."""
+        if not self._cambios_sin_guardar:
+            return
+        
+        # Sin diario abierto, o tras varios autoguardados, se reescribe la sesión completa
+        if self._diario is None or self._autosaves_sin_compactar >= self.autosaves_por_compactacion:
+            self.compactar_sesion()
+            return
+        
+        try:
+            # Los trazos ya están en el diario: basta con llevarlos al disco
+            self._diario.flush()
+            os.fsync(self._diario.fileno())
+            self._autosaves_sin_compactar += 1
+            self._cambios_sin_guardar = False
+        except Exception as e:
+            logger.error(f"Error al auto-guardar sesión: {e}")
+    
+    def _codificar_png(self, lienzo: np.ndarray) -> bytes:
+        """Codifica un lienzo como PNG con compresión rápida."""
+        # El lienzo es casi todo negro, así que en PNG ocupa una fracción del raster;
+        # el nivel 1 de compresión es varias veces más rápido y apenas ocupa más
+        exito, png = cv2.imencode('.png', lienzo, [cv2.IMWRITE_PNG_COMPRESSION, 1])
+        if not exito:
+            raise ValueError("No se pudo codificar el lienzo como PNG")
+        return png.tobytes()
+    
+    def _anadir_lienzo_base(self, datos_sesion: Dict) -> None:
+        """Guarda en la sesión el lienzo anterior al primer trazo si el historial se recortó."""
+        if self._instantaneas and self._instantaneas[0][0] == -1:
+            datos_sesion['base_png'] = self._codificar_png(self._instantaneas[0][1])
+    
+    def _escribir_metadatos(self, ruta_sesion: str, datos_sesion: Dict) -> None:
+        """Escribe junto a la sesión un JSON pequeño con los datos que muestra listar_sesiones."""
         try:
+            metadatos = {
+                'timestamp': datos_sesion['timestamp'],
+                'historial_index': datos_sesion['historial_index'],
+                'color_dibujo': datos_sesion['color_dibujo'],
+                'grosor_linea': datos_sesion['grosor_linea']
+            }
+            with open(ruta_sesion + '.meta.json', 'w', encoding='utf-8') as f:
+                json.dump(metadatos, f)
+        except Exception as e:
+            logger.error(f"Error al guardar metadatos de sesión: {e}")
+    
+    def _anotar_diario(self, entrada: Tuple) -> None:
+        """Añade un cambio al diario del autoguardado actual, si hay uno abierto."""
+        if self._diario is None:
+            return
+        try:
+            pickle.dump(entrada, self._diario, protocol=pickle.HIGHEST_PROTOCOL)
+        except Exception as e:
+            logger.error(f"Error al escribir en el diario de la sesión: {e}")
+            self.cerrar_diario()
+    
+    def cerrar_diario(self) -> None:
+        """Vuelca y cierra el diario de cambios abierto."""
+        if self._diario is None:
+            return
+        try:
+            self._diario.close()
+        except Exception as e:
+            logger.error(f"Error al cerrar el diario de la sesión: {e}")
+        self._diario = None
+    
+    def compactar_sesion(self) -> None:
+        """Escribe un autoguardado completo y empieza un diario de cambios nuevo junto a él."""
+        try:
+            self.cerrar_diario()
+            
             nombre_auto = f"autosave_{datetime.now().strftime('%Y%m%d_%H%M%S')}.session"
             ruta_sesion = os.path.join(self.sesiones_dir, nombre_auto)
             
-            # Si hay demasiados autosaves, eliminar los más antiguos
-            autosaves = [f for f in os.listdir(self.sesiones_dir) if f.startswith('autosave_')]
+            # Si hay demasiados autosaves, eliminar los más antiguos junto con sus diarios
+            autosaves = [f for f in os.listdir(self.sesiones_dir)
+                         if f.startswith('autosave_') and f.endswith('.session')]
             if len(autosaves) > 5:  # mantener solo los 5 más recientes
                 autosaves.sort()
                 for autosave_viejo in autosaves[:-5]:
-                    try:
-                        os.remove(os.path.join(self.sesiones_dir, autosave_viejo))
-                    except:
-                        pass
+                    ruta_vieja = os.path.join(self.sesiones_dir, autosave_viejo)
+                    for ruta in (ruta_vieja, ruta_vieja + '.meta.json', ruta_vieja[:-len('.session')] + '.diario'):
+                        try:
+                            os.remove(ruta)
+                        except:
+                            pass
             
             datos_sesion = {
-                'dibujo': self.dibujo.tolist(),
+                'dibujo_png': self._codificar_png(self.dibujo),
                 'historial_trazos': self.historial_trazos,
                 'historial_index': self.historial_index,
                 'color_dibujo': self.color_dibujo,
@@ -300,10 +508,16 @@ class DibujoManager:
                 'radio_borrador': self.radio_borrador,
                 'timestamp': datetime.now().isoformat()
             }
+            self._anadir_lienzo_base(datos_sesion)
             
-            with open(ruta_sesion, 'wb') as archivo:
-                pickle.dump(datos_sesion, archivo)
+            with open(ruta_sesion, 'wb', buffering=1 << 20) as archivo:
+                pickle.dump(datos_sesion, archivo, protocol=pickle.HIGHEST_PROTOCOL)
+            self._escribir_metadatos(ruta_sesion, datos_sesion)
             
+            # Los cambios siguientes se añaden al diario hasta la próxima compactación
+            self._diario = open(ruta_sesion[:-len('.session')] + '.diario', 'wb', buffering=1 << 16)
+            self._autosaves_sin_compactar = 0
+            self._cambios_sin_guardar = False
             logger.info(f"Sesión auto-guardada como {ruta_sesion}")
         except Exception as e:
             logger.error(f"Error al auto-guardar sesión: {e}")
@@ -323,13 +537,55 @@ class DibujoManager:
             with open(ruta_sesion, 'rb') as archivo:
                 datos_sesion = pickle.load(archivo)
             
-            # Restaurar todos los datos
-            self.dibujo = np.array(datos_sesion['dibujo'], dtype=np.uint8)
-            self.historial_trazos = datos_sesion['historial_trazos']
-            self.historial_index = datos_sesion['historial_index']
-            self.color_dibujo = datos_sesion['color_dibujo']
-            self.grosor_linea = datos_sesion['grosor_linea']
-            self.radio_borrador = datos_sesion['radio_borrador']
+            # Decodificar los lienzos antes de tocar el estado actual
+            if 'dibujo_png' in datos_sesion:
+                # Autoguardados: lienzo comprimido en PNG
+                dibujo = cv2.imdecode(np.frombuffer(datos_sesion['dibujo_png'], np.uint8), cv2.IMREAD_COLOR)
+            else:
+                # Las sesiones antiguas guardaban el lienzo como listas anidadas
+                dibujo = np.ascontiguousarray(datos_sesion['dibujo'], dtype=np.uint8)
+            historial_index = datos_sesion['historial_index']
+            
+            # El lienzo guardado ya refleja los trazos hasta historial_index; si el historial
+            # se recortó, el lienzo base es el punto de partida para deshacer
+            instantaneas = []
+            if 'base_png' in datos_sesion:
+                base = cv2.imdecode(np.frombuffer(datos_sesion['base_png'], np.uint8), cv2.IMREAD_COLOR)
+                instantaneas.append((-1, base))
+            if historial_index >= 0 or not instantaneas:
+                instantaneas.append((historial_index, dibujo.copy()))
+            
+            # Estado actual y su diario, para recuperarlos si el diario de la sesión falla
+            estado_anterior = {atributo: getattr(self, atributo) for atributo in (
+                'dibujo', 'historial_trazos', 'historial_index', 'color_dibujo', 'grosor_linea',
+                'radio_borrador', '_instantaneas', '_cache_reconstruccion', '_cambios_sin_guardar',
+                '_capa_temporal'
+            )}
+            diario_anterior, self._diario = self._diario, None
+            try:
+                self.dibujo = dibujo
+                self.historial_trazos = datos_sesion['historial_trazos']
+                self.historial_index = historial_index
+                self.color_dibujo = datos_sesion['color_dibujo']
+                self.grosor_linea = datos_sesion['grosor_linea']
+                self.radio_borrador = datos_sesion['radio_borrador']
+                self._instantaneas = instantaneas
+                self._cache_reconstruccion = OrderedDict()
+                
+                # Aplicar los cambios anotados en el diario después de un autoguardado
+                if ruta_sesion.endswith('.session'):
+                    if self._reproducir_diario(ruta_sesion[:-len('.session')] + '.diario'):
+                        # Los cambios del diario aún no están en ningún autoguardado completo
+                        self._cambios_sin_guardar = True
+            except Exception:
+                for atributo, valor in estado_anterior.items():
+                    setattr(self, atributo, valor)
+                self._diario = diario_anterior
+                raise
+            
+            # La sesión cargada deja de continuar el diario anterior
+            self._diario = diario_anterior
+            self.cerrar_diario()
             
             self.sesion_actual = os.path.basename(ruta_sesion)
             logger.info(f"Sesión cargada: {ruta_sesion}")
@@ -338,26 +594,69 @@ class DibujoManager:
             logger.error(f"Error al cargar sesión: {e}")
             return False
     
-    def listar_sesiones(self) -> List[Dict[str, str]]:
-        """Lista todas las sesiones guardadas con su información."""
+    def _reproducir_diario(self, ruta_diario: str) -> int:
+        """Reaplica sobre la sesión cargada los cambios guardados en su diario y devuelve cuántos aplicó."""
+        try:
+            archivo = open(ruta_diario, 'rb')
+        except FileNotFoundError:
+            return 0
+        
+        entradas = 0
+        with archivo:
+            while True:
+                try:
+                    entrada = pickle.load(archivo)
+                except (EOFError, pickle.UnpicklingError):
+                    break  # fin del diario o última entrada incompleta
+                
+                if entrada[0] == 'trazo':
+                    self._iniciar_trazo(entrada[1], recortar=False)
+                    self._aplicar_trazo(entrada[1], self.dibujo)
+                elif entrada[0] == 'indice':
+                    if not -1 <= entrada[1] < len(self.historial_trazos):
+                        logger.warning(f"Índice {entrada[1]} fuera del historial en {ruta_diario}; se ignora el resto del diario")
+                        break
+                    self.historial_index = entrada[1]
+                    self._reconstruir_dibujo()
+                elif entrada[0] == 'recorte':
+                    if not 0 < entrada[1] <= self.historial_index + 1:
+                        logger.warning(f"Recorte de {entrada[1]} trazos imposible en {ruta_diario}; se ignora el resto del diario")
+                        break
+                    self._recortar_historial(entrada[1])
+                elif entrada[0] == 'limpiar':
+                    self.limpiar_dibujo()
+                entradas += 1
+        
+        if entradas:
+            logger.info(f"Aplicados {entradas} cambios del diario {ruta_diario}")
+        return entradas
+    
+    def listar_sesiones(self, limite: Optional[int] = 50) -> List[Dict[str, str]]:
+        """Lista las sesiones guardadas más recientes (todas si limite es None) con su información."""
         sesiones = []
         try:
             if os.path.exists(self.sesiones_dir):
-                archivos = os.listdir(self.sesiones_dir)
+                with os.scandir(self.sesiones_dir) as entradas:
+                    archivos = {entrada.name for entrada in entradas if entrada.is_file()}
                 for archivo in archivos:
                     if archivo.endswith('.session'):
                         ruta_completa = os.path.join(self.sesiones_dir, archivo)
+                        es_autosave = archivo.startswith('autosave_')
                         try:
-                            # Obtener información básica sin cargar toda la sesión
-                            with open(ruta_completa, 'rb') as f:
-                                datos = pickle.load(f)
+                            # Leer el JSON de metadatos; solo las sesiones antiguas sin él se cargan enteras
+                            if archivo + '.meta.json' in archivos:
+                                with open(ruta_completa + '.meta.json', 'r', encoding='utf-8') as f:
+                                    datos = json.load(f)
+                            else:
+                                with open(ruta_completa, 'rb') as f:
+                                    datos = pickle.load(f)
                             
                             # Extraer solo los metadatos necesarios
                             sesiones.append({
                                 'nombre': archivo,
                                 'ruta': ruta_completa,
                                 'fecha': datos['timestamp'] if 'timestamp' in datos else 'Desconocido',
-                                'es_autosave': archivo.startswith('autosave_')
+                                'es_autosave': es_autosave
                             })
                         except:
                             # Si hay error al leer, incluir con información mínima
@@ -365,12 +664,14 @@ class DibujoManager:
                                 'nombre': archivo,
                                 'ruta': ruta_completa,
                                 'fecha': 'Error al leer',
-                                'es_autosave': archivo.startswith('autosave_')
+                                'es_autosave': es_autosave
                             })
             
-            # Ordenar por fecha, más reciente primero
-            sesiones.sort(key=lambda x: x['fecha'], reverse=True)
-            return sesiones
+            # Ordenar por fecha, más reciente primero; las fechas ISO se ordenan bien como texto
+            if limite is None:
+                sesiones.sort(key=itemgetter('fecha'), reverse=True)
+                return sesiones
+            return heapq.nlargest(limite, sesiones, key=itemgetter('fecha'))
         except Exception as e:
             logger.error(f"Error al listar sesiones: {e}")
             return []
@@ -388,6 +689,8 @@ class DibujoManager:
                 img = cv2.resize(img, (self.resolution[0], self.resolution[1]))
                 
             self.dibujo = img
+            # La imagen no se puede expresar en el diario: el próximo autoguardado será completo
+            self.cerrar_diario()
             # Al cargar una imagen, perdemos el historial
             self.historial_trazos = [{
                 'tipo': 'imagen_cargada',
@@ -395,6 +698,9 @@ class DibujoManager:
                 'timestamp': datetime.now().isoformat()
             }]
             self.historial_index = 0
+            self._instantaneas = [(0, img.copy())]
+            self._cache_reconstruccion.clear()
+            self._cambios_sin_guardar = True
             
             logger.info(f"Dibujo cargado desde {nombre_archivo}")
             return True
@@ -404,56 +710,65 @@ class DibujoManager:
     
     def dibujar_indicador_posicion(self, x: int, y: int, radio: int = 10) -> None:
         """Dibuja un indicador temporal de posición del cursor."""
-        self.capa_temporal = np.zeros_like(self.dibujo)
         if 0 <= x < self.resolution[0] and 0 <= y < self.resolution[1]:
-            # Dibujar círculo como indicador
-            cv2.circle(
-                self.capa_temporal,
-                (x, y),
-                radio,
-                tuple(self.colores.get("indicador", (255, 0, 255))),
-                2
-            )
-            
-            # Dibujar líneas cruzadas para mejorar visibilidad
-            cv2.line(
-                self.capa_temporal,
-                (x - radio, y),
-                (x + radio, y),
-                tuple(self.colores.get("indicador", (255, 0, 255))),
-                1
-            )
-            cv2.line(
-                self.capa_temporal,
-                (x, y - radio),
-                (x, y + radio),
-                tuple(self.colores.get("indicador", (255, 0, 255))),
-                1
-            )
+            self._capa_temporal = [('indicador', x, y, radio)]
+        else:
+            self._capa_temporal = []
+    
+    def _pintar_indicador(self, img: np.ndarray, x: int, y: int, radio: int) -> None:
+        """Pinta el indicador de posición del cursor sobre una imagen."""
+        # Dibujar círculo como indicador
+        cv2.circle(
+            img,
+            (x, y),
+            radio,
+            self._color_indicador,
+            2
+        )
+        
+        # Dibujar líneas cruzadas para mejorar visibilidad
+        cv2.line(
+            img,
+            (x - radio, y),
+            (x + radio, y),
+            self._color_indicador,
+            1
+        )
+        cv2.line(
+            img,
+            (x, y - radio),
+            (x, y + radio),
+            self._color_indicador,
+            1
+        )
     
     def dibujar_paleta_colores(self, x_base: int, y_base: int, 
                              tamano_cuadro: int = 30, 
                              margen: int = 5) -> None:
         """Dibuja una paleta de colores en la capa temporal."""
-        self.capa_temporal = np.zeros_like(self.dibujo)
+        # La posición de los cuadros solo cambia si cambian los parámetros o la paleta
+        clave = (x_base, y_base, tamano_cuadro, margen, len(self.paleta_colores))
+        if self._paleta_layout is None or self._paleta_layout[0] != clave:
+            layout = []
+            for i, (nombre, color) in enumerate(self.paleta_colores.items()):
+                x = x_base + (i % 3) * (tamano_cuadro + margen)
+                y = y_base + (i // 3) * (tamano_cuadro + margen)
+                color = tuple(color)
+                layout.append((x, y, color, np.array(color, dtype=np.uint8), nombre))
+            self._paleta_layout = (clave, layout)
         
-        for i, (nombre, color) in enumerate(self.paleta_colores.items()):
-           x = x_base + (i % 3) * (tamano_cuadro + margen)
-           y = y_base + (i // 3) * (tamano_cuadro + margen)
-           
-           # Dibujar cuadro de color
-           cv2.rectangle(
-               self.capa_temporal,
-               (x, y),
-               (x + tamano_cuadro, y + tamano_cuadro),
-               tuple(color),
-               -1
-           )
+        self._capa_temporal = [('paleta', tamano_cuadro, self._paleta_layout[1])]
+    
+    def _pintar_paleta(self, img: np.ndarray, tamano_cuadro: int, layout: List) -> None:
+        """Pinta la paleta de colores sobre una imagen."""
+        for x, y, color, color_array, nombre in layout:
+           # Dibujar cuadro de color (mismos píxeles que cv2.rectangle relleno)
+           img[max(0, y):y + tamano_cuadro + 1, max(0, x):x + tamano_cuadro + 1] = color_array
            
            # Marcar color seleccionado
-           if tuple(color) == self.color_dibujo:
+           if color == self.color_dibujo:
                cv2.rectangle(
-                   self.capa_temporal,
+                   img,
                    (x - 2, y - 2),
                    (x + tamano_cuadro + 2, y + tamano_cuadro + 2),
                    (255, 255, 255),
@@ -462,7 +777,7 @@ class DibujoManager:
            
            # Texto con nombre del color
            cv2.putText(
-               self.capa_temporal,
+               img,
                nombre,
                (x, y + tamano_cuadro + 15),
                cv2.FONT_HERSHEY_SIMPLEX,
@@ -473,10 +788,25 @@ class DibujoManager:
    
     def obtener_dibujo(self) -> np.ndarray:
        """Obtiene la imagen actual del dibujo combinada con la capa temporal."""
-       # Combinar dibujo con capa temporal
-       resultado = cv2.addWeighted(self.dibujo, 1, self.capa_temporal, 1, 0)
+       # Sin capa temporal no hay nada que combinar: el lienzo se devuelve como vista de solo lectura
+       if not self._capa_temporal:
+           return self.obtener_vista_dibujo()
+       
+       # Pintar los efectos temporales directamente sobre una copia del lienzo
+       resultado = self.dibujo.copy()
+       for efecto in self._capa_temporal:
+           if efecto[0] == 'indicador':
+               self._pintar_indicador(resultado, *efecto[1:])
+           elif efecto[0] == 'paleta':
+               self._pintar_paleta(resultado, *efecto[1:])
        return resultado
    
     def obtener_dibujo_sin_capa_temporal(self) -> np.ndarray:
        """Obtiene la imagen actual del dibujo sin la capa temporal."""
-       return self.dibujo.copy()
\ No newline at end of file
+       return self.dibujo.copy()
+   
+    def obtener_vista_dibujo(self) -> np.ndarray:
+       """Obtiene el lienzo sin copiarlo, como vista de solo lectura (BGR, contigua en C)."""
+       vista = self.dibujo.view()
+       vista.flags.writeable = False
+       return vista
\ No newline at end of file
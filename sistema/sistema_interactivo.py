@@ -69,6 +69,7 @@ class SistemaInteractivo:
         
         self.ui_manager = UIManager(self.config_manager)
         self.dibujo_manager = DibujoManager(self.config_manager)
+        self.dibujo_manager.establecer_asistente(self.asistente)
         
         # Parámetros adicionales
         self.usar_webcam = usar_webcam
@@ -365,6 +366,9 @@ class SistemaInteractivo:
                 # Procesar gestos si hay manos detectadas
                 self._procesar_gestos(results, frame)
                 
+                # Autoguardado periódico del lienzo
+                self.dibujo_manager.verificar_autosave(tiempo_inicio)
+                
                 # Obtener dibujo actual con efectos temporales
                 dibujo_actual = self.dibujo_manager.obtener_dibujo()
                 
@@ -446,11 +450,17 @@ class SistemaInteractivo:
         # Despedirse si el asistente está activo
         if hasattr(self, 'asistente') and self.asistente.activo:
             self.asistente.despedir()
+            self.asistente.esperar_anuncios_programados()
             time.sleep(2)  # Dar tiempo para que termine de hablar
         
+        # Escribir los cambios de configuración del asistente que sigan pendientes
+        if hasattr(self, 'asistente'):
+            self.asistente.guardar_config_pendiente()
+        
         # Guardar sesión antes de cerrar
         try:
             self.dibujo_manager.guardar_sesion("sesion_al_cerrar.session")
+            self.dibujo_manager.cerrar_diario()
         except:
             pass
         
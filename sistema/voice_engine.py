@@ -7,10 +7,13 @@ import threading
 import time
 import json
 import os
+import queue
 import tempfile
 import re
+import shutil
 import subprocess
-from typing import Optional, List, Dict, Tuple, Any
+import importlib.util
+from typing import Optional, List, Dict, Tuple, Any, Callable
 from enum import Enum
 
 logger = logging.getLogger("SistemaKinect.VoiceEngine")
@@ -22,29 +25,75 @@ class MotorVoz(Enum):
     AZURE_TTS = "azure_tts"    # Microsoft Azure Text-to-Speech
     OFFLINE_TTS = "offline_tts"  # Modo offline con modelos locales
 
-# Importación condicional para pyttsx3 (motor básico)
-try:
-    import pyttsx3
-    PYTTSX3_DISPONIBLE = True
-except ImportError:
+def _modulo_instalado(nombre: str) -> bool:
+    """Comprueba si un módulo está instalado sin ejecutar su código."""
+    try:
+        return importlib.util.find_spec(nombre) is not None
+    except (ImportError, ValueError):
+        return False
+
+# Los SDK de cada motor solo se comprueban aquí; se importan al iniciar ese
+# motor (pyttsx3 inicializa SAPI/NSSS y Azure carga una DLL nativa)
+pyttsx3 = None
+texttospeech = None
+speechsdk = None
+
+# Disponibilidad de pyttsx3 (motor básico)
+PYTTSX3_DISPONIBLE = _modulo_instalado("pyttsx3")
+if not PYTTSX3_DISPONIBLE:
     logger.warning("pyttsx3 no está disponible. Síntesis básica desactivada.")
-    PYTTSX3_DISPONIBLE = False
 
-# Importación condicional para Google Cloud TTS
-try:
-    from google.cloud import texttospeech
-    GOOGLE_TTS_DISPONIBLE = True
-except ImportError:
+# Disponibilidad de Google Cloud TTS
+GOOGLE_TTS_DISPONIBLE = _modulo_instalado("google.cloud.texttospeech")
+if not GOOGLE_TTS_DISPONIBLE:
     logger.warning("Google Cloud TTS no está disponible. Instala con: pip install google-cloud-texttospeech")
-    GOOGLE_TTS_DISPONIBLE = False
 
-# Importación condicional para Azure Speech
+# Disponibilidad de Azure Speech
+AZURE_TTS_DISPONIBLE = _modulo_instalado("azure.cognitiveservices.speech")
+if not AZURE_TTS_DISPONIBLE:
+    logger.warning("Azure Speech no está disponible. Instala con: pip install azure-cognitiveservices-speech")
+
+# orjson (opcional) decodifica y codifica la configuración en C
 try:
-    import azure.cognitiveservices.speech as speechsdk
-    AZURE_TTS_DISPONIBLE = True
+    import orjson
+    ORJSON_DISPONIBLE = True
 except ImportError:
-    logger.warning("Azure Speech no está disponible. Instala con: pip install azure-cognitiveservices-speech")
-    AZURE_TTS_DISPONIBLE = False
+    ORJSON_DISPONIBLE = False
+
+# sounddevice (PortAudio) permite reproducir PCM sin pasar por disco ni por pygame
+SOUNDDEVICE_DISPONIBLE = _modulo_instalado("sounddevice") and _modulo_instalado("numpy")
+
+def _leer_json(ruta: str) -> Any:
+    """Lee un archivo JSON con orjson si está disponible o con json en su defecto."""
+    with open(ruta, 'rb') as f:
+        datos = f.read()
+    if ORJSON_DISPONIBLE:
+        return orjson.loads(datos)
+    return json.loads(datos)
+
+def _escribir_json(ruta: str, obj: Any) -> None:
+    """Escribe un objeto como JSON con sangría de forma atómica."""
+    if ORJSON_DISPONIBLE:
+        datos = orjson.dumps(obj, option=orjson.OPT_INDENT_2)
+    else:
+        datos = json.dumps(obj, indent=4).encode('utf-8')
+    ruta_tmp = ruta + '.tmp'
+    with open(ruta_tmp, 'wb') as f:
+        f.write(datos)
+    os.replace(ruta_tmp, ruta)
+
+def _importar_sdk(motor: MotorVoz) -> None:
+    """Importa el SDK de un motor la primera vez que se inicia."""
+    global pyttsx3, texttospeech, speechsdk
+    if motor == MotorVoz.PYTTSX3 and pyttsx3 is None:
+        import pyttsx3 as modulo_pyttsx3
+        pyttsx3 = modulo_pyttsx3
+    elif motor == MotorVoz.GOOGLE_TTS and texttospeech is None:
+        from google.cloud import texttospeech as modulo_texttospeech
+        texttospeech = modulo_texttospeech
+    elif motor == MotorVoz.AZURE_TTS and speechsdk is None:
+        import azure.cognitiveservices.speech as modulo_speechsdk
+        speechsdk = modulo_speechsdk
 
 class VoiceEngine:
     """Gestiona la síntesis de voz mejorada con múltiples motores y opciones avanzadas."""
@@ -97,8 +146,22 @@ class VoiceEngine:
         }
     }
     
-    def __init__(self, config_path=None):
+    # Frecuencia de muestreo del audio PCM pedido a Google TTS
+    FRECUENCIA_PCM = 24000
+    
+    # Si ffmpeg está instalado (None hasta comprobarlo por primera vez)
+    _FFMPEG_DISPONIBLE = None
+    
+    # Formato del audio que genera cada motor al sintetizar a archivo
+    EXTENSIONES_AUDIO = {
+        MotorVoz.PYTTSX3: ".wav",
+        MotorVoz.GOOGLE_TTS: ".mp3",
+        MotorVoz.AZURE_TTS: ".wav"
+    }
+    
+    def __init__(self, config_path=None, config_dict=None):
         self.config_path = config_path
+        self.config_dict = config_dict
         self.engine = None
         self.motor_actual = None
         self.iniciado = False
@@ -137,14 +200,15 @@ class VoiceEngine:
     def _cargar_config(self) -> Dict:
         """Carga la configuración de voz desde archivo o usa valores predeterminados."""
         try:
-            if self.config_path and os.path.exists(self.config_path):
-                with open(self.config_path, 'r', encoding='utf-8') as f:
-                    config = json.load(f)
+            if self.config_dict is not None:
+                # Configuración en memoria: no se lee ni se persiste en disco
+                return dict(self.config_dict)
+            elif self.config_path and os.path.exists(self.config_path):
+                config = _leer_json(self.config_path)
                 logger.info(f"Configuración de voz cargada desde {self.config_path}.")
                 return config
             elif os.path.exists(self.CONFIG_FILE):
-                with open(self.CONFIG_FILE, 'r', encoding='utf-8') as f:
-                    config = json.load(f)
+                config = _leer_json(self.CONFIG_FILE)
                 logger.info("Configuración de voz cargada desde archivo predeterminado.")
                 return config
             else:
@@ -156,9 +220,11 @@ class VoiceEngine:
     
     def _guardar_config(self) -> bool:
         """Guarda la configuración actual de voz en archivo."""
+        if self.config_dict is not None:
+            return True
+        
         try:
-            with open(self.CONFIG_FILE, 'w', encoding='utf-8') as f:
-                json.dump(self.config, f, indent=4)
+            _escribir_json(self.CONFIG_FILE, self.config)
             logger.info("Configuración de voz guardada correctamente.")
             return True
         except Exception as e:
@@ -198,6 +264,7 @@ class VoiceEngine:
             return False
         
         try:
+            _importar_sdk(MotorVoz.PYTTSX3)
             self.engine = pyttsx3.init()
             
             # Obtener voces disponibles y clasificarlas
@@ -235,6 +302,7 @@ class VoiceEngine:
                 logger.warning(f"Archivo de credenciales no encontrado: {credenciales_path}. Verificar configuración.")
             
             # Inicializar cliente
+            _importar_sdk(MotorVoz.GOOGLE_TTS)
             self.google_client = texttospeech.TextToSpeechClient()
             
             # Obtener voces disponibles
@@ -269,6 +337,7 @@ class VoiceEngine:
                 return False
             
             # Configurar speech
+            _importar_sdk(MotorVoz.AZURE_TTS)
             self.azure_speech_config = speechsdk.SpeechConfig(subscription=subscription_key, region=region)
             self.azure_speech_config.speech_synthesis_voice_name = self.config.get('azure_tts', {}).get('voz_preferida', 'es-ES-ElviraNeural')
             
@@ -666,11 +735,11 @@ class VoiceEngine:
         except Exception as e:
             logger.error(f"Error durante síntesis con pyttsx3: {e}")
     
-    def _hablar_google_tts(self, texto: str) -> None:
-        """Sintetiza voz usando Google Cloud TTS."""
+    def _sintetizar_google_tts(self, texto: str, pcm: bool = False) -> Optional[bytes]:
+        """Sintetiza texto con Google Cloud TTS y devuelve el audio MP3 (o WAV PCM de 16 bits si pcm)."""
         if not self.google_client:
             logger.error("Cliente Google TTS no inicializado.")
-            return
+            return None
             
         try:
             # Determinar si usar SSML
@@ -732,11 +801,19 @@ class VoiceEngine:
             tono = self.config.get('tono', 0.0)
             velocidad = self.config.get('velocidad', 1.0)
             
-            audio_config = texttospeech.AudioConfig(
-                audio_encoding=texttospeech.AudioEncoding.MP3,
-                speaking_rate=velocidad,
-                pitch=tono
-            )
+            if pcm:
+                audio_config = texttospeech.AudioConfig(
+                    audio_encoding=texttospeech.AudioEncoding.LINEAR16,
+                    sample_rate_hertz=self.FRECUENCIA_PCM,
+                    speaking_rate=velocidad,
+                    pitch=tono
+                )
+            else:
+                audio_config = texttospeech.AudioConfig(
+                    audio_encoding=texttospeech.AudioEncoding.MP3,
+                    speaking_rate=velocidad,
+                    pitch=tono
+                )
             
             # Realizar síntesis
             response = self.google_client.synthesize_speech(
@@ -744,18 +821,35 @@ class VoiceEngine:
                 voice=voice,
                 audio_config=audio_config
             )
+            return response.audio_content
+        except Exception as e:
+            logger.error(f"Error durante síntesis con Google TTS: {e}")
+            return None
+    
+    def _hablar_google_tts(self, texto: str) -> None:
+        """Sintetiza voz usando Google Cloud TTS."""
+        # Sin efectos, pedir PCM y reproducirlo directamente con sounddevice
+        usar_pcm = SOUNDDEVICE_DISPONIBLE and not self.config.get('efectos_audio', False)
+        
+        audio_content = self._sintetizar_google_tts(texto, pcm=usar_pcm)
+        if audio_content is None:
+            return
+        
+        if usar_pcm and self._reproducir_pcm(audio_content, self.FRECUENCIA_PCM):
+            return
             
+        try:
             # Crear directorio temporal si no existe
             if not os.path.exists(self.temp_dir):
                 os.makedirs(self.temp_dir, exist_ok=True)
             
             # Usar un nombre de archivo simple sin espacios (evita problemas con playsound)
-            archivo_audio = f"tts_{int(time.time())}.mp3"
+            archivo_audio = f"tts_{int(time.time())}{'.wav' if usar_pcm else '.mp3'}"
             ruta_audio = os.path.join(self.temp_dir, archivo_audio)
             
             # Guardar audio en archivo temporal
             with open(ruta_audio, "wb") as out:
-                out.write(response.audio_content)
+                out.write(audio_content)
             
             # Aplicar efectos si están habilitados
             if self.config.get('efectos_audio', False):
@@ -772,7 +866,27 @@ class VoiceEngine:
                 logger.warning(f"No se pudo eliminar archivo temporal: {e}")
                 
         except Exception as e:
-            logger.error(f"Error durante síntesis con Google TTS: {e}")
+            logger.error(f"Error al reproducir audio de Google TTS: {e}")
+    
+    def _sintetizar_azure_tts(self, texto: str, ruta_audio: str):
+        """Sintetiza texto con Azure Speech en un archivo y devuelve el resultado."""
+        # Determinar si usar SSML
+        usar_ssml = self.config.get('usar_ssml', True) and ('<speak>' in texto or '<break' in texto or '<emphasis' in texto)
+        
+        # Configurar salida de audio a archivo
+        audio_config = speechsdk.audio.AudioOutputConfig(filename=ruta_audio)
+        
+        # Crear sintetizador con configuración específica
+        synthesizer = speechsdk.SpeechSynthesizer(
+            speech_config=self.azure_speech_config, 
+            audio_config=audio_config
+        )
+        
+        if usar_ssml:
+            # Asegurar formato SSML completo
+            texto_ssml = self._convertir_a_ssml(texto)
+            return synthesizer.speak_ssml_async(texto_ssml).get()
+        return synthesizer.speak_text_async(texto).get()
     
     def _hablar_azure_tts(self, texto: str) -> None:
         """Sintetiza voz usando Microsoft Azure Speech."""
@@ -781,9 +895,6 @@ class VoiceEngine:
             return
             
         try:
-            # Determinar si usar SSML
-            usar_ssml = self.config.get('usar_ssml', True) and ('<speak>' in texto or '<break' in texto or '<emphasis' in texto)
-            
             # Crear ruta para archivo de salida
             archivo_audio = f"tts_{int(time.time())}.wav"
             ruta_audio = os.path.join(self.temp_dir, archivo_audio)
@@ -792,22 +903,8 @@ class VoiceEngine:
             if not os.path.exists(self.temp_dir):
                 os.makedirs(self.temp_dir, exist_ok=True)
             
-            # Configurar salida de audio a archivo
-            audio_config = speechsdk.audio.AudioOutputConfig(filename=ruta_audio)
-            
-            # Crear sintetizador con configuración específica
-            synthesizer = speechsdk.SpeechSynthesizer(
-                speech_config=self.azure_speech_config, 
-                audio_config=audio_config
-            )
-            
             # Realizar síntesis con manejo detallado de errores
-            if usar_ssml:
-                # Asegurar formato SSML completo
-                texto_ssml = self._convertir_a_ssml(texto)
-                result = synthesizer.speak_ssml_async(texto_ssml).get()
-            else:
-                result = synthesizer.speak_text_async(texto).get()
+            result = self._sintetizar_azure_tts(texto, ruta_audio)
             
             # Verificar resultado
             if result.reason == speechsdk.ResultReason.SynthesizingAudioCompleted:
@@ -865,13 +962,18 @@ class VoiceEngine:
         except Exception as e:
             logger.error(f"Error durante síntesis offline: {e}")
     
+    @classmethod
+    def _ffmpeg_disponible(cls) -> bool:
+        """Comprueba si ffmpeg está en el PATH, recordando el resultado."""
+        if cls._FFMPEG_DISPONIBLE is None:
+            cls._FFMPEG_DISPONIBLE = shutil.which('ffmpeg') is not None
+        return cls._FFMPEG_DISPONIBLE
+    
     def _aplicar_efectos_audio(self, archivo_audio: str) -> str:
         """Aplica efectos sutiles para hacer la voz más natural."""
         try:
-            # Verificar si ffmpeg está instalado
-            try:
-                subprocess.run(['ffmpeg', '-version'], stdout=subprocess.PIPE, stderr=subprocess.PIPE, check=True)
-            except (subprocess.SubprocessError, FileNotFoundError):
+            # Verificar si ffmpeg está instalado (una sola vez por proceso)
+            if not self._ffmpeg_disponible():
                 logger.warning("ffmpeg no está instalado. No se pueden aplicar efectos de audio.")
                 return archivo_audio
                 
@@ -901,7 +1003,23 @@ class VoiceEngine:
             logger.error(f"Error al aplicar efectos de audio: {e}")
             return archivo_audio  # Devolver archivo original si hay error
     
-    def _reproducir_audio(self, archivo_audio: str) -> bool:
+    @staticmethod
+    def _reproducir_pcm(audio_wav: bytes, frecuencia: int) -> bool:
+        """Reproduce audio WAV PCM de 16 bits en memoria con sounddevice."""
+        try:
+            import numpy as np
+            import sounddevice as sd
+            
+            # Saltar la cabecera WAV de 44 bytes y reproducir las muestras
+            muestras = np.frombuffer(audio_wav[44:], dtype=np.int16)
+            sd.play(muestras, frecuencia, blocking=True)
+            return True
+        except Exception as e:
+            logger.warning(f"No se pudo reproducir PCM con sounddevice: {e}")
+            return False
+    
+    @classmethod
+    def _reproducir_audio(cls, archivo_audio: str) -> bool:
         """Reproduce un archivo de audio usando varios métodos."""
         if not os.path.exists(archivo_audio):
             logger.error(f"Archivo de audio no encontrado: {archivo_audio}")
@@ -911,11 +1029,11 @@ class VoiceEngine:
         
         # Intentar varios métodos de reproducción
         metodos_reproduccion = [
-            self._reproducir_con_pygame,
-            self._reproducir_con_winsound,
-            self._reproducir_con_reproductor_sistema,
-            self._reproducir_con_playsound,
-            self._reproducir_con_subprocess
+            cls._reproducir_con_pygame,
+            cls._reproducir_con_winsound,
+            cls._reproducir_con_reproductor_sistema,
+            cls._reproducir_con_playsound,
+            cls._reproducir_con_subprocess
         ]
         
         for metodo in metodos_reproduccion:
@@ -929,7 +1047,8 @@ class VoiceEngine:
         logger.error("No se pudo reproducir el audio con ningún método disponible")
         return False
     
-    def _reproducir_con_playsound(self, archivo_audio: str) -> bool:
+    @staticmethod
+    def _reproducir_con_playsound(archivo_audio: str) -> bool:
         """Intenta reproducir audio con playsound."""
         try:
             # Importar playsound de forma condicional
@@ -948,7 +1067,8 @@ class VoiceEngine:
             logger.warning(f"Error al reproducir con playsound: {e}")
             return False
     
-    def _reproducir_con_reproductor_sistema(self, archivo_audio: str) -> bool:
+    @staticmethod
+    def _reproducir_con_reproductor_sistema(archivo_audio: str) -> bool:
         """Intenta reproducir con el reproductor predeterminado del sistema."""
         try:
             if os.name == 'nt':  # Windows
@@ -969,7 +1089,8 @@ class VoiceEngine:
             logger.warning(f"Error al reproducir con reproductor del sistema: {e}")
             return False
     
-    def _reproducir_con_winsound(self, archivo_audio: str) -> bool:
+    @staticmethod
+    def _reproducir_con_winsound(archivo_audio: str) -> bool:
         """Intenta reproducir con winsound (solo Windows y solo archivos WAV)."""
         if os.name != 'nt':
             return False
@@ -997,7 +1118,8 @@ class VoiceEngine:
         except Exception:
             return False
     
-    def _reproducir_con_pygame(self, archivo_audio: str) -> bool:
+    @staticmethod
+    def _reproducir_con_pygame(archivo_audio: str) -> bool:
         """Intenta reproducir con pygame."""
         try:
             import pygame
@@ -1020,7 +1142,8 @@ class VoiceEngine:
                 pass
             return False
     
-    def _reproducir_con_subprocess(self, archivo_audio: str) -> bool:
+    @staticmethod
+    def _reproducir_con_subprocess(archivo_audio: str) -> bool:
         """Intenta reproducir con reproductores comunes mediante subprocess."""
         try:
             # Lista de reproductores comunes
@@ -1306,4 +1429,111 @@ class VoiceEngine:
         except Exception as e:
             logger.error(f"Error durante síntesis de voz síncrona: {e}")
             self.hablando = False
-            return False
\ No newline at end of file
+            return False
+    
+    def hablar_por_frases(self, texto: str,
+                          sintetizar_frase: Optional[Callable[[str], Optional[str]]] = None) -> bool:
+        """Habla un texto largo frase a frase, sintetizando la siguiente mientras suena la actual.
+        
+        sintetizar_frase permite decidir de dónde sale el audio de cada frase (por
+        ejemplo, de un caché); si devuelve None la frase se habla directamente.
+        """
+        if not self.iniciado:
+            logger.warning("Motor de síntesis de voz no iniciado. No se puede hablar.")
+            return False
+        
+        if sintetizar_frase is None:
+            sintetizar_frase = self._sintetizar_frase_temporal
+        
+        frases = [frase for frase in re.split(r'(?<=[.!?])\s+', texto.strip()) if frase]
+        
+        # Como mucho dos frases sintetizadas esperando a reproducirse
+        cola = queue.Queue(maxsize=2)
+        
+        # Un motor como pyttsx3 no admite sintetizar y hablar a la vez desde dos hilos
+        uso_motor = threading.Lock()
+        
+        def producir():
+            try:
+                for frase in frases:
+                    try:
+                        with uso_motor:
+                            ruta = sintetizar_frase(frase)
+                    except Exception as e:
+                        logger.error(f"Error al sintetizar frase: {e}")
+                        ruta = None
+                    cola.put((frase, ruta))
+            finally:
+                cola.put(None)
+        
+        threading.Thread(target=producir, daemon=True).start()
+        
+        while (elemento := cola.get()) is not None:
+            frase, ruta = elemento
+            if ruta:
+                self._reproducir_audio(ruta)
+                
+                # Borrar solo los archivos temporales propios, no los de un caché
+                if os.path.dirname(ruta) == self.temp_dir:
+                    try:
+                        os.remove(ruta)
+                    except OSError:
+                        pass
+            else:
+                with uso_motor:
+                    self.hablar_sincrono(frase)
+        
+        return True
+    
+    def _sintetizar_frase_temporal(self, frase: str) -> Optional[str]:
+        """Sintetiza una frase en un archivo temporal y devuelve su ruta, o None si el motor no lo permite."""
+        extension = self.EXTENSIONES_AUDIO.get(self.motor_actual)
+        if not extension:
+            return None
+        
+        ruta_audio = os.path.join(self.temp_dir, f"frase_{time.time_ns()}{extension}")
+        return ruta_audio if self.sintetizar_a_archivo(frase, ruta_audio) else None
+    
+    def sintetizar_a_archivo(self, texto: str, ruta_destino: str) -> bool:
+        """Sintetiza un texto en un archivo de audio sin reproducirlo.
+        
+        Args:
+            texto: Texto a sintetizar
+            ruta_destino: Ruta del archivo de salida (ver EXTENSIONES_AUDIO)
+        """
+        if not self.iniciado:
+            logger.warning("Motor de síntesis de voz no iniciado. No se puede sintetizar.")
+            return False
+        
+        try:
+            texto_procesado = self._preprocesar_texto(texto)
+            
+            if self.motor_actual == MotorVoz.PYTTSX3:
+                # pyttsx3 no entiende las marcas de pausa del preprocesado
+                texto_limpio = texto_procesado.replace(' <pause_corta>', '').replace(' <pause>', '')
+                self.engine.save_to_file(texto_limpio, ruta_destino)
+                self.engine.runAndWait()
+            elif self.motor_actual == MotorVoz.GOOGLE_TTS:
+                audio_content = self._sintetizar_google_tts(texto_procesado)
+                if audio_content is None:
+                    return False
+                with open(ruta_destino, "wb") as out:
+                    out.write(audio_content)
+            elif self.motor_actual == MotorVoz.AZURE_TTS:
+                result = self._sintetizar_azure_tts(texto_procesado, ruta_destino)
+                if result.reason != speechsdk.ResultReason.SynthesizingAudioCompleted:
+                    logger.error(f"Error en síntesis de Azure: {result.reason}")
+                    return False
+            else:
+                logger.warning(f"El motor {self.motor_actual} no permite sintetizar a archivo.")
+                return False
+            
+            return os.path.exists(ruta_destino)
+        except Exception as e:
+            logger.error(f"Error al sintetizar a archivo: {e}")
+            return False
+    
+    @classmethod
+    def reproducir_archivo(cls, archivo_audio: str) -> bool:
+        """Reproduce un archivo de audio ya sintetizado sin necesidad de iniciar un motor."""
+        return cls._reproducir_audio(archivo_audio)
\ No newline at end of file
@@ -5,6 +5,7 @@ Módulo para añadir emociones y expresividad a la síntesis de voz.
 import logging
 import random
 import time
+from collections import deque
 from typing import Dict, Optional, Tuple
 from enum import Enum
 
@@ -63,7 +64,7 @@ class GestorVozEmotiva:
         self.emocion_actual = Emocion.NEUTRAL
         self.intensidad_emocion = 1.0
         self.usar_expresiones = True
-        self.historial_emociones = []
+        self.historial_emociones = deque(maxlen=50)
     
     def detectar_emocion_contextual(self, contexto: str, texto: str) -> Emocion:
         """Detecta la emoción apropiada según el contexto."""
@@ -135,10 +136,6 @@ class GestorVozEmotiva:
             "timestamp": time.time()
         })
         
-        # Mantener historial limitado
-        if len(self.historial_emociones) > 50:
-            self.historial_emociones.pop(0)
-        
         return texto_modificado, config_ajustada
     
     def _añadir_enfasis_ssml(self, texto: str, emocion: Emocion) -> str:
@@ -0,0 +1,96 @@
+"""
+Pruebas del historial de DibujoManager: recorte, instantáneas y diario de autoguardado.
+"""
+
+import os
+import random
+import time
+
+import pytest
+
+np = pytest.importorskip("numpy")
+pytest.importorskip("cv2")
+
+from sistema.dibujo_manager import DibujoManager, MAX_HISTORIAL
+
+class _ConfigPrueba:
+    """Sustituto mínimo de ConfigManager: lienzo pequeño y autoguardado en cada comprobación."""
+    
+    def __init__(self, sesiones_dir: str):
+        self.sesiones_dir = sesiones_dir
+    
+    def obtener_config(self) -> dict:
+        return {
+            "kinect": {"resolution": [160, 120]},
+            "dibujo": {
+                "sesiones_dir": self.sesiones_dir,
+                "autosave_interval": 0,
+                "autosaves_por_compactacion": 3,
+                "radio_borrador": 6
+            }
+        }
+
+def _ultimo_autosave(sesiones_dir: str) -> str:
+    """Devuelve la ruta del autoguardado completo más reciente."""
+    autosaves = sorted(f for f in os.listdir(sesiones_dir)
+                       if f.startswith("autosave_") and f.endswith(".session"))
+    return os.path.join(sesiones_dir, autosaves[-1])
+
+def _comprobar_recuperacion(original: DibujoManager, sesiones_dir: str, todos_los_indices: bool = False) -> None:
+    """Carga el último autoguardado en un gestor nuevo y lo compara con el original."""
+    cargado = DibujoManager(_ConfigPrueba(sesiones_dir))
+    assert cargado.cargar_sesion(_ultimo_autosave(sesiones_dir))
+    
+    assert cargado.historial_index == original.historial_index
+    assert len(cargado.historial_trazos) == len(original.historial_trazos)
+    assert np.array_equal(cargado.dibujo, original.dibujo)
+    
+    # Todos los estados a los que se puede llegar deshaciendo o rehaciendo son iguales
+    if todos_los_indices:
+        for indice in range(-1, len(original.historial_trazos)):
+            assert np.array_equal(cargado._lienzo_en_indice(indice), original._lienzo_en_indice(indice))
+
+def test_sesion_recortada_se_recupera_con_su_diario(tmp_path):
+    """Con más de MAX_HISTORIAL trazos, deshacer/rehacer y autoguardados, la sesión cargada coincide."""
+    sesiones_dir = str(tmp_path)
+    original = DibujoManager(_ConfigPrueba(sesiones_dir))
+    aleatorio = random.Random(5)
+    tiempo = time.time()
+    
+    def punto():
+        return aleatorio.randrange(160), aleatorio.randrange(120)
+    
+    def autoguardar():
+        nonlocal tiempo
+        tiempo += 1
+        original.verificar_autosave(tiempo)
+    
+    for _ in range(2 * MAX_HISTORIAL + 150):
+        accion = aleatorio.random()
+        if accion < 0.7:
+            original.cambiar_color((aleatorio.randrange(1, 256), aleatorio.randrange(256), 0))
+            for i in range(aleatorio.randint(2, 4)):
+                original.dibujar_punto(*punto())
+                # Un autoguardado a mitad de trazo debe esperar a que termine
+                if i == 0 and aleatorio.random() < 0.2:
+                    autoguardar()
+            original.terminar_dibujo()
+        elif accion < 0.78:
+            for _ in range(aleatorio.randint(1, 3)):
+                original.borrar_punto(*punto())
+            original.terminar_dibujo()
+        elif accion < 0.9:
+            original.deshacer()
+        else:
+            original.rehacer()
+        
+        if aleatorio.random() < 0.2:
+            autoguardar()
+            _comprobar_recuperacion(original, sesiones_dir)
+    autoguardar()
+    
+    # El historial se recortó: el lienzo anterior al primer trazo ya no es negro
+    assert original._instantaneas[0][0] == -1
+    
+    _comprobar_recuperacion(original, sesiones_dir, todos_los_indices=True)
+    original.cerrar_diario()
\ No newline at end of file